@@ -0,0 +1,59 @@
+import random
+
+from ted import Buffer, File, FilePosition
+
+
+def test_type_at_start(benchmark, buffer):
+    file = File(buffer, FilePosition.origin())
+    benchmark(file.write_char, 'a')
+
+
+def test_type_in_middle(benchmark, buffer):
+    line = buffer.line_count() // 2
+    file = File(buffer, FilePosition(x=buffer.line_length(line) // 2, y=line))
+    benchmark(file.write_char, 'a')
+
+
+def test_type_at_end(benchmark, buffer):
+    line = buffer.line_count() - 1
+    file = File(buffer, FilePosition(x=buffer.line_length(line), y=line))
+    benchmark(file.write_char, 'a')
+
+
+def test_random_access_insert(benchmark, buffer):
+    rng = random.Random(0)
+
+    def insert():
+        buffer.insert('a', rng.randrange(len(buffer) + 1))
+
+    benchmark(insert)
+
+
+def test_random_access_delete(benchmark, buffer):
+    rng = random.Random(0)
+
+    def delete():
+        buffer.delete(rng.randrange(len(buffer)), 1)
+
+    benchmark(delete)
+
+
+def test_materialise_after_edit(benchmark, buffer):
+    # fragment the tree first, so materialising has many pieces to join.
+    rng = random.Random(0)
+    for _ in range(1000):
+        buffer.insert('a', rng.randrange(len(buffer) + 1))
+
+    def setup():
+        buffer._text = None
+
+    benchmark.pedantic(str, args=(buffer,), setup=setup, rounds=5)
+
+
+def test_save(benchmark, buffer, tmp_path):
+    buffer.insert('edited\n', len(buffer) // 2)
+    benchmark.pedantic(buffer.save, args=(tmp_path / 'saved.txt',), rounds=5)
+
+
+def test_load(benchmark, text):
+    benchmark.pedantic(Buffer, args=(text,), rounds=5)
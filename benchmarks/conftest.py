@@ -0,0 +1,40 @@
+import random
+
+import pytest
+from pytest_benchmark.utils import parse_compare_fail
+
+from ted import Buffer
+
+# With --benchmark-compare, fail the run when a benchmark's mean is more than this much slower than the baseline.
+COMPARE_FAIL = 'mean:10%'
+
+# 10k lines is a large source file, 1M lines a real-world application log.
+LINE_COUNTS = [10_000, 100_000, 1_000_000]
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod']
+
+
+def make_text(line_count, seed=0):
+    """Lines of varying length, like source code or a log."""
+    rng = random.Random(seed)
+    return ''.join(' '.join(rng.choices(WORDS, k=rng.randint(0, 12))) + '\n' for _ in range(line_count))
+
+
+def pytest_configure(config):
+    if config.getoption('benchmark_compare', None) and not config.getoption('benchmark_compare_fail', None):
+        config.option.benchmark_compare_fail = [parse_compare_fail(COMPARE_FAIL)]
+
+
+_texts = {}
+
+
+@pytest.fixture(params=LINE_COUNTS, ids=lambda count: f'{count}-lines')
+def text(request):
+    if request.param not in _texts:
+        _texts[request.param] = make_text(request.param)
+    return _texts[request.param]
+
+
+@pytest.fixture
+def buffer(text):
+    return Buffer(text)
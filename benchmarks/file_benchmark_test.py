@@ -0,0 +1,31 @@
+from ted import File, FilePosition
+
+
+def test_move_down(benchmark, buffer):
+    file = File(buffer, FilePosition.origin())
+    last_line = buffer.line_count() - 1
+
+    def move_down():
+        if file.line_pos == last_line:
+            file.line_pos = 0
+        file.move_down()
+
+    benchmark(move_down)
+
+
+def test_move_right(benchmark, buffer):
+    line = buffer.line_count() // 2
+    file = File(buffer, FilePosition(x=0, y=line))
+
+    def move_right():
+        file.char_pos = 0
+        file.move_right()
+
+    benchmark(move_right)
+
+
+def test_get_char(benchmark, buffer):
+    line = buffer.line_count() // 2
+    file = File(buffer, FilePosition(x=0, y=line))
+    buffer.insert('a', buffer.line_start(line))
+    benchmark(file.get_char)
@@ -0,0 +1,27 @@
+from ted import HeadlessScreen, curses_main
+
+# a short editing session: move into the file, type, scroll a page and delete a little.
+SESSION = ['KEY_DOWN'] * 30 + ['KEY_RIGHT'] * 5 + list('typed text') + ['KEY_DOWN'] * 40 + ['KEY_BACKSPACE'] * 3
+
+
+def test_editing_session(benchmark, text, tmp_path):
+    path = tmp_path / 'edited.txt'
+    path.write_text(text)
+
+    def run():
+        screen = HeadlessScreen(SESSION + ['q'])
+        curses_main(screen, str(path), doupdate=screen.doupdate)
+
+    benchmark.pedantic(run, rounds=3)
+
+
+def test_single_key_redraw(benchmark, text, tmp_path):
+    # the cost of the loop for one key: read it, apply it and draw the frame, on top of a fixed startup cost.
+    path = tmp_path / 'edited.txt'
+    path.write_text(text)
+
+    def run():
+        screen = HeadlessScreen(['KEY_DOWN', 'q'])
+        curses_main(screen, str(path), doupdate=screen.doupdate)
+
+    benchmark.pedantic(run, rounds=3)
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+from pathlib import Path
+
+TED = Path(__file__).parent.parent / 'ted.py'
+
+
+def test_import(benchmark):
+    benchmark.pedantic(subprocess.run, args=([sys.executable, '-c', 'import ted'],), kwargs={
+        'cwd': TED.parent, 'check': True,
+    }, rounds=10)
+
+
+def test_open_to_first_paint(benchmark, text, tmp_path):
+    # replaying an empty trace starts the editor, draws the first frame and exits as soon as it waits for a key.
+    path = tmp_path / 'big.txt'
+    path.write_text(text)
+    trace = tmp_path / 'empty.jsonl'
+    trace.write_text('')
+
+    benchmark.pedantic(subprocess.run, args=([sys.executable, str(TED), '--replay', str(trace), str(path)],), kwargs={
+        'check': True, 'capture_output': True,
+    }, rounds=5)
@@ -1,56 +1,584 @@
 #! python3
-import argparse
-import curses
-import logging
+import bisect
+import codecs
+import collections
+import contextlib
+import functools
+import keyword
 import math
+import mmap
+import os
+import random
+import re
+import sys
+import time
+import unicodedata
 from dataclasses import dataclass
 
 
-logging.basicConfig(filename='example.log', encoding='utf-8', level=logging.DEBUG)
-
-
 @dataclass
 class Piece:
+    # a fragmented buffer holds a great many pieces, so skip the per-instance __dict__.
+    __slots__ = ('source', 'start', 'length')
+
     source: str
     start: int
     length: int
 
 
+@dataclass
+class Edit:
+    """A change made to a buffer, in both character and line terms."""
+    start: int
+    removed: int
+    inserted: int
+    line: int
+    removed_lines: int
+    inserted_lines: int
+
+    def inverted(self):
+        """Return the edit that undoes this one."""
+        return Edit(
+            start=self.start, removed=self.inserted, inserted=self.removed, line=self.line,
+            removed_lines=self.inserted_lines, inserted_lines=self.removed_lines,
+        )
+
+
+class _PieceNode:
+    """A node in the balanced piece tree.
+
+    The piece table is held as a treap ordered by document position. Each node caches the number of pieces,
+    characters and newlines in its subtree so offset and line lookups, splits and joins are O(log n). Nodes are never
+    mutated once built; every edit builds new nodes along the affected path.
+    """
+
+    __slots__ = ('piece', 'priority', 'piece_newlines', 'left', 'right', 'count', 'size', 'newlines')
+
+    def __init__(self, piece, priority, piece_newlines, left=None, right=None):
+        self.piece = piece
+        self.priority = priority
+        self.piece_newlines = piece_newlines
+        self.left = left
+        self.right = right
+        self.count = 1 + _count(left) + _count(right)
+        self.size = piece.length + _size(left) + _size(right)
+        self.newlines = piece_newlines + _newlines(left) + _newlines(right)
+
+    def with_children(self, left, right):
+        return _PieceNode(self.piece, self.priority, self.piece_newlines, left, right)
+
+
+def _count(node):
+    return node.count if node is not None else 0
+
+
+def _size(node):
+    return node.size if node is not None else 0
+
+
+def _newlines(node):
+    return node.newlines if node is not None else 0
+
+
+def _merge(left, right):
+    """Join two trees, every piece of `left` preceding every piece of `right`."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        return left.with_children(left.left, _merge(left.right, right))
+    return right.with_children(_merge(left, right.left), right.right)
+
+
+def _split(node, count):
+    """Split a tree into the first `count` pieces and the rest."""
+    if node is None:
+        return None, None
+    left_count = _count(node.left)
+    if count <= left_count:
+        left, right = _split(node.left, count)
+        return left, node.with_children(right, node.right)
+    left, right = _split(node.right, count - left_count - 1)
+    return node.with_children(node.left, left), right
+
+
+def _iter_pieces(node):
+    stack = []
+    while stack or node is not None:
+        while node is not None:
+            stack.append(node)
+            node = node.left
+        node = stack.pop()
+        yield node.piece
+        node = node.right
+
+
+def _iter_range(node, start, stop, offset=0):
+    """Yield `(piece, offset)` for every piece overlapping the character range `start:stop`."""
+    if node is None or start >= offset + node.size or stop <= offset:
+        return
+    yield from _iter_range(node.left, start, stop, offset)
+    offset += _size(node.left)
+    if start < offset + node.piece.length and stop > offset:
+        yield node.piece, offset
+    yield from _iter_range(node.right, start, stop, offset + node.piece.length)
+
+
+# files are read as UTF-8 with their line endings left as they are. bytes that are not valid UTF-8 are kept as lone
+# surrogates, so saving writes back exactly the bytes that were read.
+ENCODING = 'utf-8'
+ENCODING_ERRORS = 'surrogateescape'
+
+
+def _decode(data):
+    return data.decode(ENCODING, ENCODING_ERRORS)
+
+
+def _decoder():
+    """An incremental decoder following the same policy as `_decode`, for reading a file in chunks."""
+    return codecs.getincrementaldecoder(ENCODING)(ENCODING_ERRORS)
+
+
+def _find_newlines(text, offset=0):
+    """Return the positions of every newline in `text`, shifted by `offset`."""
+    positions = []
+    index = text.find('\n')
+    while index != -1:
+        positions.append(index + offset)
+        index = text.find('\n', index + 1)
+    return positions
+
+
+class _LineBreaks:
+    """The sorted positions of the newlines in an in-memory source."""
+
+    __slots__ = ('_positions',)
+
+    def __init__(self, text=''):
+        self._positions = _find_newlines(text)
+
+    def extend(self, positions):
+        self._positions.extend(positions)
+
+    def newlines_before(self, position):
+        return bisect.bisect_left(self._positions, position)
+
+    def newline(self, index):
+        return self._positions[index]
+
+
+class MappedText:
+    """Read-only text backed by a memory-mapped file, decoded by `_decode`.
+
+    Opening only records the character and newline counts of each chunk. The text and newline positions of a chunk
+    are decoded the first time they are needed and a few recently used chunks are kept, so a huge file can be shown
+    without holding it in memory. Supports `len()` and slicing like `str`, and the newline queries of `_LineBreaks`.
+
+    With `lazy`, opening records nothing, and the text grows as the counts `scan` finds are handed to `extend`. Its
+    length and newline count cover only those chunks until the scan is `done`.
+    """
+
+    CHUNK_SIZE = 1 << 20
+    CACHED_CHUNKS = 16
+
+    def __init__(self, path, chunk_size=None, lazy=False):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        # byte offset, character offset and preceding newline count of each chunk, plus a final entry for the end.
+        self._byte_starts = [0]
+        self._char_starts = [0]
+        self._newline_starts = [0]
+        self._decoded = collections.OrderedDict()
+        self._positions = collections.OrderedDict()
+        if not lazy:
+            self.extend(self.scan())
+
+    @property
+    def size(self) -> int:
+        """The size of the file in bytes."""
+        return len(self._map)
+
+    @property
+    def done(self) -> bool:
+        """Whether every chunk has been recorded."""
+        return self._byte_starts[-1] >= len(self._map)
+
+    def scan(self):
+        """Yield the byte offset each chunk after those recorded ends at, with its character and newline counts.
+
+        Only reads the file, so it can run on a worker thread while the text is in use.
+        """
+        size = len(self._map)
+        start = self._byte_starts[-1]
+        while start < size:
+            stop = min(start + self._chunk_size, size)
+            # never split a multi-byte character across two chunks. one is at most four bytes, so back off no more
+            # than three, and always leave at least one byte in the chunk so a run of stray continuation bytes still
+            # moves us on.
+            limit = max(start + 1, stop - 3)
+            while limit < stop < size and self._map[stop] & 0xC0 == 0x80:
+                stop -= 1
+            chunk = self._map[start:stop]
+            yield stop, len(chunk) if chunk.isascii() else len(_decode(chunk)), chunk.count(b'\n')
+            start = stop
+
+    def extend(self, chunks):
+        """Record the `(stop, characters, newlines)` of chunks found by `scan`, in order, adding their text."""
+        for stop, chars, newlines in chunks:
+            self._byte_starts.append(stop)
+            self._char_starts.append(self._char_starts[-1] + chars)
+            self._newline_starts.append(self._newline_starts[-1] + newlines)
+
+    def __len__(self):
+        return self._char_starts[-1]
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(len(self))
+        slices = []
+        chunk = self._chunk_at(start)
+        while start < stop:
+            text = self._text(chunk)
+            offset = self._char_starts[chunk]
+            slices.append(text[start - offset:stop - offset])
+            start = self._char_starts[chunk + 1]
+            chunk += 1
+        return ''.join(slices)
+
+    def newlines_before(self, position):
+        chunk = self._chunk_at(position)
+        return self._newline_starts[chunk] + bisect.bisect_left(self._newline_positions(chunk), position)
+
+    def newline(self, index):
+        chunk = bisect.bisect_right(self._newline_starts, index) - 1
+        return self._newline_positions(chunk)[index - self._newline_starts[chunk]]
+
+    def close(self):
+        self._map.close()
+
+    def _chunk_at(self, position):
+        return min(bisect.bisect_right(self._char_starts, position), len(self._char_starts) - 1) - 1
+
+    def _text(self, chunk):
+        return self._cached(self._decoded, chunk, lambda: _decode(self._map[
+            self._byte_starts[chunk]:self._byte_starts[chunk + 1]
+        ]))
+
+    def _newline_positions(self, chunk):
+        return self._cached(self._positions, chunk, lambda: _find_newlines(self._text(chunk), self._char_starts[chunk]))
+
+    def _cached(self, cache, chunk, load):
+        if chunk in cache:
+            cache.move_to_end(chunk)
+        else:
+            cache[chunk] = load()
+            if len(cache) > self.CACHED_CHUNKS:
+                cache.popitem(last=False)
+        return cache[chunk]
+
+
+class ChunkedText:
+    """Append-only text stored as fixed-size blocks.
+
+    Appending copies at most one block, however long the text grows, and existing offsets never move. Supports
+    `len()` and slicing like `str`.
+    """
+
+    BLOCK_SIZE = 4096
+
+    def __init__(self, text=''):
+        self._blocks = []
+        self._tail = ''
+        self._length = 0
+        self.append(text)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self._length)
+        slices = []
+        while start < stop:
+            block, offset = divmod(start, self.BLOCK_SIZE)
+            text = self._blocks[block] if block < len(self._blocks) else self._tail
+            slices.append(text[offset:offset + stop - start])
+            start += len(slices[-1])
+        return ''.join(slices)
+
+    def append(self, text):
+        self._length += len(text)
+        room = self.BLOCK_SIZE - len(self._tail)
+        if len(text) < room:
+            self._tail += text
+            return
+
+        self._blocks.append(self._tail + text[:room])
+        for start in range(room, len(text) - self.BLOCK_SIZE + 1, self.BLOCK_SIZE):
+            self._blocks.append(text[start:start + self.BLOCK_SIZE])
+        self._tail = text[len(text) - (len(text) - room) % self.BLOCK_SIZE:]
+
+
+def _fsync_directory(path):
+    # so a file just renamed into the directory is still there after a crash. not every platform can open a
+    # directory to sync it, in which case there is nothing more we can do.
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 class Buffer:
 
     ORIGINAL = '_original'
     ADD = '_add'
 
+    # files at least this large are memory-mapped rather than read into memory.
+    MMAP_THRESHOLD = 16 << 20
+    # the most characters `iter_chunks` yields at once.
+    CHUNK_SIZE = 1 << 20
+    # how far back a regular expression search looks across chunk boundaries.
+    SEARCH_OVERLAP = 1 << 10
+    # a rough count of the bytes each piece costs, with its tree node, for `resident_size`.
+    NODE_SIZE = 200
+
     def __init__(self, initial=''):
         self._original = initial
-        self._add = ''
-        self._piece_table = []
+        self._add = ChunkedText()
+        self._sources = {self.ORIGINAL: self._original, self.ADD: self._add}
+        self._root = None
+        self._text = None
+        # (root, edit) pairs: the tree from before each undoable edit, and from after each undone one.
+        self._undo = []
+        self._redo = []
+        self._grouping = False
+        # the tree as last saved, or as loaded, so we can tell whether there are unsaved changes.
+        self._saved = None
+
+        # the newline positions of each source, so we can count the newlines in any piece without scanning it.
+        self._line_breaks = {
+            self.ORIGINAL: initial if isinstance(initial, MappedText) else _LineBreaks(initial),
+            self.ADD: _LineBreaks(),
+        }
 
         if initial:
-            self._piece_table.append(Piece(start=0, length=len(initial), source=self.ORIGINAL))
+            self._root = self._new_node(Piece(start=0, length=len(initial), source=self.ORIGINAL))
+        self._saved = self._root
+
+    @classmethod
+    def from_file(cls, path, use_mmap=None):
+        """Create a buffer holding the contents of `path`.
+
+        By default only files of at least `MMAP_THRESHOLD` bytes are memory-mapped. Either way the text is decoded
+        by `_decode`, so it is the same, and saving it gives back the same bytes.
+        """
+        if use_mmap is None:
+            use_mmap = os.path.getsize(path) >= cls.MMAP_THRESHOLD
+        if use_mmap and os.path.getsize(path) > 0:
+            return cls(MappedText(path))
+        with open(path, 'rb') as f:
+            return cls(_decode(f.read()))
 
     def __str__(self):
-        text: str = ''
-        for piece in self._piece_table:
-            source: str = piece.source
-            buffer: str = getattr(self, source)
-            text += buffer[piece.start:piece.start + piece.length]
-        return text
+        # the materialised text is cached until the next edit, so repeated reads between edits are free.
+        if self._text is None:
+            sources = self._sources
+            self._text = ''.join(
+                sources[piece.source][piece.start:piece.start + piece.length] for piece in self._iter_pieces()
+            )
+        return self._text
 
     def __len__(self):
-        return len(str(self))
+        # the root caches the character count of the whole tree, kept up to date by every edit.
+        return _size(self._root)
+
+    @property
+    def modified(self):
+        """Whether the text differs from when it was last saved or loaded, going by edits rather than content."""
+        return self._root is not self._saved
+
+    def resident_size(self):
+        """Roughly how many bytes of memory the buffer holds on to.
+
+        The pages of a memory-mapped original are not counted, as the system can drop them whenever it needs to.
+        """
+        size = _count(self._root) * self.NODE_SIZE
+        for source in (self._original, self._add):
+            if not isinstance(source, MappedText):
+                size += len(source)
+        return size
+
+    def close(self):
+        """Release the memory map behind the original, if any. The buffer must not be used afterwards."""
+        if isinstance(self._original, MappedText):
+            self._original.close()
+
+    @property
+    def _piece_table(self):
+        return list(self._iter_pieces())
+
+    def _iter_pieces(self):
+        return _iter_pieces(self._root)
 
     # to deprecate in favour of insert
     def add_char(self, value):
-        self._add += value
-
-    def insert(self, text, index):
+        self._line_breaks[self.ADD].extend(_find_newlines(value, len(self._add)))
+        self._add.append(value)
+
+    def insert(self, text, index, group=False):
+        """Insert `text` at the character offset `index` and return the resulting `Edit`.
+
+        With `group`, an insert that continues straight on from the previous grouped insert is undone together
+        with it.
+        """
+
+        self._text = None
+        previous = self._root
+        line = self.line_of(index)
+        inserted_lines = self._insert(text, index)
+        edit = Edit(
+            start=index, removed=0, inserted=len(text), line=line, removed_lines=0, inserted_lines=inserted_lines,
+        )
+        self._push_undo(previous, edit, group)
+        return edit
+
+    def insert_many(self, edits):
+        """Apply a batch of `(text, index)` inserts as one undo unit.
+
+        Every index refers to the text before the batch, so callers need not shift later indexes by earlier inserts.
+        Inserts at the same index keep their given order. Returns the `Edit` of each insert, in order through the
+        text and each in terms of the text left by those before it, so they can be passed on one at a time; the
+        list is empty if there was nothing to insert.
+        """
+        edits = sorted(((text, index) for text, index in edits if text), key=lambda edit: edit[1])
+        if not edits:
+            return []
+
+        self._text = None
+        previous = self._root
+        first, last = edits[0][1], edits[-1][1]
+        line = self.line_of(first)
+        spanned_lines = self.line_of(last) - line
+
+        applied = []
+        shift = 0
+        for text, index in edits:
+            start = index + shift
+            start_line = self.line_of(start)
+            applied.append(Edit(
+                start=start, removed=0, inserted=len(text), line=start_line, removed_lines=0,
+                inserted_lines=self._insert(text, start),
+            ))
+            shift += len(text)
+
+        # undone in one go, so the undo history holds the batch as a single edit over the text it spans.
+        self._push_undo(previous, Edit(
+            start=first, removed=last - first, inserted=last - first + shift, line=line, removed_lines=spanned_lines,
+            inserted_lines=spanned_lines + sum(edit.inserted_lines for edit in applied),
+        ), False)
+        return applied
+
+    def load(self, text):
+        """Append newly loaded text to the end of the original, outside the undo history.
+
+        Used to fill the buffer a chunk at a time as a file loads, and returns the `Edit` so the new lines can be
+        drawn. Loading must be finished before the buffer is edited, as undoing an edit would also drop any text
+        loaded after it.
+        """
+        if not isinstance(self._original, ChunkedText):
+            self._original = self._sources[self.ORIGINAL] = ChunkedText(self._original)
+
+        start = len(self._original)
+        self._line_breaks[self.ORIGINAL].extend(_find_newlines(text, start))
+        return self._load_original(lambda: self._original.append(text))
+
+    def load_mapped(self, chunks):
+        """Append more of a lazily opened `MappedText` original, as `load` does, given the chunks its `scan` found."""
+        return self._load_original(lambda: self._original.extend(chunks))
+
+    def _load_original(self, append):
+        self._text = None
+        index = len(self)
+        line = self.line_of(index)
+        start = len(self._original)
+        append()
+        piece = Piece(start=start, length=len(self._original) - start, source=self.ORIGINAL)
+        node = self._new_node(piece)
+        if piece.length:
+            unmodified = not self.modified
+            self._root = _merge(self._root, node)
+            if unmodified:
+                self._saved = self._root
+        return Edit(
+            start=index, removed=0, inserted=piece.length, line=line, removed_lines=0,
+            inserted_lines=node.piece_newlines,
+        )
+
+    def delete(self, start, length):
+        """Remove `length` characters from the character offset `start` and return the resulting `Edit`."""
+        return self.replace(start, length, '')
+
+    def replace(self, start, length, text):
+        """Replace `length` characters from the character offset `start` with `text` as a single edit.
+
+        Only the pieces at either end of the range are split; those in between are dropped whole, and no text is
+        copied.
+        """
+        self._text = None
+        previous = self._root
+        line = self.line_of(start)
+
+        head, rest = self._split_at(self._root, start)
+        removed, tail = self._split_at(rest, length)
+        if text:
+            added = len(self._add)
+            line_breaks = _find_newlines(text, added)
+            self._line_breaks[self.ADD].extend(line_breaks)
+            self._add.append(text)
+            head = _merge(head, self._new_node(Piece(start=added, length=len(text), source=self.ADD)))
+        else:
+            line_breaks = []
+        self._root = _merge(head, tail)
+
+        edit = Edit(
+            start=start, removed=_size(removed), inserted=len(text), line=line,
+            removed_lines=_newlines(removed), inserted_lines=len(line_breaks),
+        )
+        self._push_undo(previous, edit, False)
+        return edit
+
+    def _split_at(self, node, offset):
+        """Split a tree into the pieces before and after the character offset `offset`, splitting a piece if needed."""
+        if node is None:
+            return None, None
+        left_size = _size(node.left)
+        if offset <= left_size:
+            left, right = self._split_at(node.left, offset)
+            return left, node.with_children(right, node.right)
+        offset -= left_size
+        if offset >= node.piece.length:
+            left, right = self._split_at(node.right, offset - node.piece.length)
+            return node.with_children(node.left, left), right
+        left_piece, right_piece = self._split_piece(node.piece, offset)
+        return _merge(node.left, self._new_node(left_piece)), _merge(self._new_node(right_piece), node.right)
+
+    def _insert(self, text, index):
+        """Insert `text` into the piece tree at `index`, returning the number of newlines inserted."""
+        start = len(self._add)
+        line_breaks = _find_newlines(text, start)
+        self._line_breaks[self.ADD].extend(line_breaks)
+        self._add.append(text)
 
         # shortcut handling of the special cases of the first add, or an addition at index 0 to avoid work.
         # if index == 0 or len(self._add) == 0:
         if index == 0:
-            piece = Piece(start=len(self._add), length=len(text), source=self.ADD)
-            self._piece_table.insert(0, piece)
+            piece = Piece(start=start, length=len(text), source=self.ADD)
+            self._root = _merge(self._new_node(piece), self._root)
 
         else:
             table_index, piece_index = self._get_indexes(index)
@@ -58,43 +586,801 @@ class Buffer:
             if table_index is None:
                 # no matching piece, so we need to add one at the end. special case for the first addition
                 # when it is at the end.
-                piece = Piece(start=len(self._add), length=len(text), source=self.ADD)
-                self._piece_table.append(piece)
+                piece = Piece(start=start, length=len(text), source=self.ADD)
+                self._root = _merge(self._root, self._new_node(piece))
 
             else:
-                old_piece = self._piece_table[table_index]
+                head, rest = _split(self._root, table_index)
+                old_node, tail = _split(rest, 1)
+                old_piece = old_node.piece
                 left, right = self._split_piece(old_piece, piece_index)
 
-                if left.source == self.ORIGINAL:
-                    # we can't append original pieces, so we need to create an add piece.
-                    piece = Piece(start=len(self._add), length=len(text), source=self.ADD)
-                    new = [left, piece, right]
-                    self._piece_table = self._piece_table[0:table_index] + new + self._piece_table[table_index + 1:]
-                elif piece_index == old_piece.length:
-                    old_piece.length += len(text)
+                appendable = (
+                    left.source == self.ADD
+                    and piece_index == old_piece.length
+                    and old_piece.start + old_piece.length == start
+                )
+                if not appendable:
+                    # we can only extend an add piece when inserting at its end, and it ends where the add buffer
+                    # does. otherwise we need to create a new add piece, dropping any empty piece either side of it.
+                    piece = Piece(start=start, length=len(text), source=self.ADD)
+                    new = self._new_node(piece)
+                    if left.length:
+                        new = _merge(self._new_node(left), new)
+                    if right.length:
+                        new = _merge(new, self._new_node(right))
                 else:
-                    piece = Piece(start=old_piece.length, length=len(text), source=self.ADD)
-                    new = [left, piece, right]
-                    self._piece_table = self._piece_table[0:table_index] + new + self._piece_table[table_index + 1:]
-
-        self._add += text
+                    extended = Piece(start=old_piece.start, length=old_piece.length + len(text), source=self.ADD)
+                    new = self._new_node(extended, old_node.priority)
+                self._root = _merge(_merge(head, new), tail)
+
+        return len(line_breaks)
+
+    def compact(self):
+        """Rebuild the piece tree with the fewest pieces, joining neighbours that are contiguous in one source."""
+        pieces = []
+        for piece in self._iter_pieces():
+            if pieces and pieces[-1].source == piece.source and pieces[-1].start + pieces[-1].length == piece.start:
+                last = pieces[-1]
+                pieces[-1] = Piece(start=last.start, length=last.length + piece.length, source=last.source)
+            elif piece.length:
+                pieces.append(piece)
+
+        # hand out priorities in descending order, parents before children, to keep the tree a valid treap.
+        priorities = iter(sorted((random.random() for _ in pieces), reverse=True))
+
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = self._new_node(pieces[mid], next(priorities))
+            return node.with_children(build(lo, mid), build(mid + 1, hi))
+
+        old_root, self._root = self._root, build(0, len(pieces))
+        # the text is unchanged, so a buffer that was unmodified stays that way.
+        if self._saved is old_root:
+            self._saved = self._root
+
+    def undo(self):
+        """Revert the last edit and return the `Edit` describing the reversal, or None if there is nothing to undo."""
+        if not self._undo:
+            return None
+        root, edit = self._undo.pop()
+        self._redo.append((self._root, edit))
+        self._set_root(root)
+        return edit.inverted()
+
+    def redo(self):
+        """Reapply the last undone edit and return it, or None if there is nothing to redo."""
+        if not self._redo:
+            return None
+        root, edit = self._redo.pop()
+        self._undo.append((self._root, edit))
+        self._set_root(root)
+        return edit
+
+    def _push_undo(self, root, edit, group):
+        # both sources are append-only and tree nodes are never mutated, so the root from before an edit is a
+        # complete snapshot that shares all but O(log n) nodes with the current tree.
+        self._redo.clear()
+        if group and self._grouping and self._undo:
+            last_root, last = self._undo[-1]
+            if last.removed == 0 and last.start + last.inserted == edit.start:
+                self._undo[-1] = (last_root, Edit(
+                    start=last.start, removed=0, inserted=last.inserted + edit.inserted, line=last.line,
+                    removed_lines=0, inserted_lines=last.inserted_lines + edit.inserted_lines,
+                ))
+                return
+        self._undo.append((root, edit))
+        self._grouping = group
+
+    def _set_root(self, root):
+        self._root = root
+        self._text = None
+        self._grouping = False
+
+    def iter_chunks(self, start=0, stop=None):
+        """Yield the text between `start` and `stop` piece by piece, in slices of at most `CHUNK_SIZE` characters."""
+        if stop is None:
+            stop = len(self)
+        for piece, offset in _iter_range(self._root, start, stop):
+            buffer: str = self._sources[piece.source]
+            piece_start = piece.start + max(start - offset, 0)
+            piece_stop = piece.start + min(stop - offset, piece.length)
+            for chunk_start in range(piece_start, piece_stop, self.CHUNK_SIZE):
+                yield buffer[chunk_start:min(chunk_start + self.CHUNK_SIZE, piece_stop)]
+
+    def finditer(self, pattern, start=0, regex=False, overlap=None):
+        """Yield the offset of each match of `pattern` from `start` onwards, without building the whole text.
+
+        The text is scanned a chunk at a time, keeping the last `overlap` characters of each chunk so matches that
+        span chunks are found. For literal patterns the overlap is always enough. For regular expressions it defaults
+        to `SEARCH_OVERLAP`: a match reaching into the last `overlap` characters loaded is put off until the next
+        chunk, so a long match grows the window and is rescanned rather than cut short. The same number of characters
+        are kept before where each scan begins, so `^`, `\\b` and lookbehinds see the text before it.
+        """
+        if regex:
+            compiled = re.compile(pattern)
+            overlap = self.SEARCH_OVERLAP if overlap is None else overlap
+            context = max(overlap, 1)
+        else:
+            compiled = re.compile(re.escape(pattern))
+            overlap = len(pattern) - 1
+            context = 0
+
+        window = ''
+        window_start = max(start - context, 0)
+        position = start - window_start
+        for chunk in self.iter_chunks(window_start):
+            window += chunk
+            resume = max(len(window) - overlap, position)
+            for match in compiled.finditer(window, position):
+                if regex and match.end() > len(window) - overlap:
+                    # the match may carry on into the next chunk, so look at it again once that is loaded.
+                    resume = match.start()
+                    break
+                yield window_start + match.start()
+                position = max(match.end(), match.start() + 1)
+                resume = max(resume, position)
+            resume = min(resume, len(window))
+            # the scan never starts at the beginning of a trimmed window, which would look like the start of the text.
+            keep = max(resume - context, 0)
+            window = window[keep:]
+            window_start += keep
+            position = resume - keep
+
+        for match in compiled.finditer(window, position):
+            yield window_start + match.start()
+
+    def find(self, pattern, start=0, regex=False):
+        """Return the offset of the first match of `pattern` from `start` onwards, or None."""
+        return next(self.finditer(pattern, start, regex), None)
+
+    def write_to(self, fileobj):
+        """Write the text to `fileobj` without building it in memory."""
+        for chunk in self.iter_chunks():
+            fileobj.write(chunk)
+
+    def save(self, path):
+        """Write the text to `path`, replacing it atomically so a failed save never leaves a partial file.
+
+        The new contents, and the directory entry pointing at them, are synced to disk before returning. If `path` is a
+        symlink, the file it points to is replaced and the link is kept.
+        """
+        import shutil
+        import tempfile
+
+        path = os.path.realpath(path)
+        directory = os.path.dirname(path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding=ENCODING, errors=ENCODING_ERRORS, newline='') as f:
+                self.write_to(f)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                shutil.copymode(path, temp_path)
+            else:
+                # the temporary file is only readable by us, where a new file would follow the umask.
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(temp_path, 0o666 & ~umask)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        _fsync_directory(directory)
+        self._saved = self._root
+
+    def get_text(self, start, stop):
+        """Return the text between the character offsets `start` and `stop`."""
+        if self._text is not None:
+            return self._text[start:stop]
+        slices = []
+        for piece, offset in _iter_range(self._root, start, stop):
+            buffer: str = self._sources[piece.source]
+            piece_start = piece.start + max(start - offset, 0)
+            piece_stop = piece.start + min(stop - offset, piece.length)
+            slices.append(buffer[piece_start:piece_stop])
+        return ''.join(slices)
+
+    def line_count(self):
+        """Return the number of lines, counting the (possibly empty) line after a trailing newline."""
+        return _newlines(self._root) + 1
+
+    def line_start(self, line):
+        """Return the character offset of the start of `line`."""
+        if line <= 0:
+            return 0
+        if line >= self.line_count():
+            return len(self)
+
+        # find the piece holding the newline that ends the previous line.
+        node = self._root
+        offset = 0
+        remaining = line
+        while True:
+            left_newlines = _newlines(node.left)
+            if remaining <= left_newlines:
+                node = node.left
+                continue
+            remaining -= left_newlines
+            offset += _size(node.left)
+            if remaining <= node.piece_newlines:
+                break
+            remaining -= node.piece_newlines
+            offset += node.piece.length
+            node = node.right
+
+        piece = node.piece
+        line_breaks = self._line_breaks[piece.source]
+        first = line_breaks.newlines_before(piece.start)
+        return offset + line_breaks.newline(first + remaining - 1) - piece.start + 1
+
+    def line_of(self, offset):
+        """Return the line holding the character offset `offset`."""
+        node = self._root
+        line = 0
+        while node is not None:
+            left_size = _size(node.left)
+            if offset <= left_size:
+                node = node.left
+                continue
+            offset -= left_size
+            line += _newlines(node.left)
+            if offset <= node.piece.length:
+                piece = node.piece
+                line_breaks = self._line_breaks[piece.source]
+                return line + line_breaks.newlines_before(piece.start + offset) - line_breaks.newlines_before(piece.start)
+            offset -= node.piece.length
+            line += node.piece_newlines
+            node = node.right
+        return line
+
+    def line_length(self, line):
+        """Return the number of characters in `line`, excluding its newline."""
+        start = self.line_start(line)
+        if line + 1 >= self.line_count():
+            return len(self) - start
+        return self.line_start(line + 1) - 1 - start
+
+    def get_line(self, line, start=0, stop=None):
+        """Return the text of `line`, excluding its newline, or just the characters from `start` to `stop` of it.
+
+        Only the pieces holding the requested characters are read, so a slice of a huge line is cheap.
+        """
+        length = self.line_length(line)
+        stop = length if stop is None else min(stop, length)
+        line_start = self.line_start(line)
+        return self.get_text(line_start + min(start, stop), line_start + stop)
+
+    def offset_of(self, line, col):
+        """Return the character offset of column `col` on `line`."""
+        return self.line_start(line) + col
+
+    def _new_node(self, piece, priority=None):
+        line_breaks = self._line_breaks[piece.source]
+        piece_newlines = (
+            line_breaks.newlines_before(piece.start + piece.length) - line_breaks.newlines_before(piece.start)
+        )
+        return _PieceNode(piece, random.random() if priority is None else priority, piece_newlines)
 
     def _get_indexes(self, char_index):
-        accumulator = 0
-        for table_index, piece in enumerate(self._piece_table):
-            accumulator += piece.length
-            if char_index <= accumulator:
-                piece_index = piece.length - (accumulator - char_index)
-                return table_index, piece_index
+        node = self._root
+        table_offset = 0
+        while node is not None:
+            left_size = _size(node.left)
+            if node.left is not None and char_index <= left_size:
+                node = node.left
+                continue
+            char_index -= left_size
+            table_offset += _count(node.left)
+            if char_index <= node.piece.length:
+                return table_offset, char_index
+            char_index -= node.piece.length
+            table_offset += 1
+            node = node.right
         return None, None
 
     @staticmethod
     def _split_piece(piece, index):
         return [
             Piece(start=piece.start, length=index, source=piece.source),
-            Piece(start=index, length=piece.length - index, source=piece.source),
+            Piece(start=piece.start + index, length=piece.length - index, source=piece.source),
+        ]
+
+
+class SearchIndex:
+    """The offsets of every occurrence of a literal pattern in a buffer, including overlapping ones.
+
+    Built once with a full scan, a chunk at a time, then kept up to date by `update`, which only rescans the text
+    around an edit. The offsets are held in blocks of up to `BLOCK_SIZE`, each with a shift still to be added to
+    them, so an edit rewrites the block it falls in and moves those after it by changing their shifts alone.
+    """
+
+    BLOCK_SIZE = 1024
+
+    def __init__(self, buffer: Buffer, pattern: str) -> None:
+        self._buffer = buffer
+        self.pattern = pattern
+        self._blocks = self._split(self._scan_all())
+        self._shifts = [0] * len(self._blocks)
+
+    @property
+    def offsets(self):
+        return [offset + shift for block, shift in zip(self._blocks, self._shifts) for offset in block]
+
+    def update(self, edit: Edit) -> None:
+        # occurrences overlapping the replaced range are gone, and those after it have moved.
+        low = edit.start - len(self.pattern)
+        high = edit.start + edit.removed
+        first = self._block_after(low)
+        last = first + 1
+        while last < len(self._blocks) and self._blocks[last][0] + self._shifts[last] < high:
+            last += 1
+        offsets = [
+            offset + shift for block, shift in zip(self._blocks[first:last], self._shifts[first:last])
+            for offset in block
         ]
 
+        shift = edit.inserted - edit.removed
+        before = bisect.bisect_right(offsets, low)
+        after = bisect.bisect_left(offsets, high)
+        blocks = self._split(
+            offsets[:before]
+            + self._scan(edit.start - len(self.pattern) + 1, edit.start + edit.inserted + len(self.pattern) - 1)
+            + [offset + shift for offset in offsets[after:]]
+        )
+        self._blocks[first:last] = blocks
+        self._shifts[first:last] = [0] * len(blocks)
+        if shift:
+            for index in range(first + len(blocks), len(self._shifts)):
+                self._shifts[index] += shift
+
+    def next_after(self, offset: int):
+        """Return the first occurrence after `offset`, wrapping around to the start, or None if there are none."""
+        index = self._block_after(offset)
+        if index < len(self._blocks):
+            block, shift = self._blocks[index], self._shifts[index]
+            return block[bisect.bisect_right(block, offset - shift)] + shift
+        return self._blocks[0][0] + self._shifts[0] if self._blocks else None
+
+    def _block_after(self, offset):
+        """The index of the first block with an occurrence after `offset`, or the number of blocks if none has."""
+        lo, hi = 0, len(self._blocks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._blocks[mid][-1] + self._shifts[mid] > offset:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _split(self, offsets):
+        return [offsets[start:start + self.BLOCK_SIZE] for start in range(0, len(offsets), self.BLOCK_SIZE)]
+
+    def _scan_all(self):
+        if not self.pattern:
+            return []
+        # keep the last characters of each chunk, too few to hold an occurrence, to find those spanning chunks.
+        overlap = len(self.pattern) - 1
+        offsets = []
+        window = ''
+        window_start = 0
+        for chunk in self._buffer.iter_chunks():
+            window += chunk
+            offsets.extend(window_start + index for index in self._find_all(window))
+            keep = max(len(window) - overlap, 0)
+            window = window[keep:]
+            window_start += keep
+        return offsets
+
+    def _find_all(self, text):
+        index = text.find(self.pattern)
+        while index != -1:
+            yield index
+            index = text.find(self.pattern, index + 1)
+
+    def _scan(self, start, stop):
+        start = max(start, 0)
+        if not self.pattern:
+            return []
+        return [start + index for index in self._find_all(self._buffer.get_text(start, stop))]
+
+
+class FileLoader:
+    """Reads a file on a worker thread, decoded as by `_decode`, handing it over a chunk at a time with `drain`."""
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path, chunk_size=None) -> None:
+        self._start(os.path.getsize(path), self._load, path, chunk_size or self.CHUNK_SIZE)
+
+    def _start(self, size, load, *args):
+        import queue
+        import threading
+
+        self.done = False
+        self._size = size
+        self._read = 0
+        self._chunks = queue.Queue()
+        self._thread = threading.Thread(target=load, args=args, daemon=True)
+        self._thread.start()
+
+    @property
+    def progress(self) -> int:
+        """The percentage of the file read so far."""
+        return self._read * 100 // self._size if self._size else 100
+
+    def drain(self, buffer: Buffer, wait=False):
+        """Load every chunk read so far into `buffer`, returning the `Edit` or None if there were none.
+
+        With `wait`, block until at least one chunk is ready, so a first screen can be shown as soon as possible.
+        """
+        import queue
+
+        chunks = []
+        try:
+            chunks.append(self._chunks.get(block=wait))
+            while True:
+                chunks.append(self._chunks.get_nowait())
+        except queue.Empty:
+            pass
+
+        if chunks and chunks[-1] is None:
+            self.done = True
+            chunks.pop()
+        for chunk in chunks:
+            if isinstance(chunk, BaseException):
+                raise chunk
+        if not chunks:
+            return None
+        return self._hand_over(buffer, chunks)
+
+    def _hand_over(self, buffer, chunks):
+        return buffer.load(''.join(chunks))
+
+    def _load(self, path, chunk_size):
+        decoder = _decoder()
+        try:
+            with open(path, 'rb') as f:
+                for data in iter(lambda: f.read(chunk_size), b''):
+                    self._read += len(data)
+                    self._chunks.put(decoder.decode(data))
+                self._chunks.put(decoder.decode(b'', final=True))
+        except OSError as error:
+            self._chunks.put(error)
+        self._chunks.put(None)
+
+
+class MappedLoader(FileLoader):
+    """Finishes opening a lazily opened `MappedText` on a worker thread, handing its chunks over with `drain`.
+
+    Counting the characters and newlines of a huge file takes a while, so it is shown as soon as the first chunk is
+    counted and grows like a file read by `FileLoader`.
+    """
+
+    def __init__(self, text: MappedText) -> None:
+        self._start(text.size, self._load, text)
+
+    def _hand_over(self, buffer, chunks):
+        return buffer.load_mapped(chunks)
+
+    def _load(self, text):
+        try:
+            for chunk in text.scan():
+                self._read = chunk[0]
+                self._chunks.put(chunk)
+        except (OSError, ValueError) as error:
+            # a ValueError means the map was closed, as the file was closed while it was still opening.
+            self._chunks.put(error)
+        self._chunks.put(None)
+
+
+class Journal:
+    """An append-only log of the edits made to a file since it was last saved, for recovering them after a crash.
+
+    Each edit is written as a line of JSON holding its offset, the length it removed and the text it inserted, which
+    replayed in order onto the file as saved gives back the edited text. Lines are handed to the system as they are
+    written but only synced to disk every `SYNC_INTERVAL` seconds. The first line records the size and modification
+    time of the file, so a journal left behind by an older version of it is ignored.
+    """
+
+    SYNC_INTERVAL = 1.0
+
+    def __init__(self, path) -> None:
+        self.path = path
+        directory, name = os.path.split(os.path.abspath(path))
+        self.journal_path = os.path.join(directory, f'.{name}.journal')
+        self._file = None
+        # when the oldest edit not yet synced to disk was written.
+        self._unsynced_since = None
+        self._header = self._stat()
+
+    @property
+    def pending(self) -> bool:
+        """Whether there are edits written but not yet synced to disk."""
+        return self._unsynced_since is not None
+
+    def has_edits(self) -> bool:
+        """Whether there is a journal for the current version of the file holding edits to recover."""
+        import json
+
+        try:
+            with open(self.journal_path, encoding='utf-8') as f:
+                header, edit = f.readline(), f.readline()
+        except FileNotFoundError:
+            return False
+        try:
+            return json.loads(header) == self._header and bool(edit)
+        except ValueError:
+            return False
+
+    def recover(self, buffer: Buffer) -> int:
+        """Replay the journalled edits onto `buffer`, holding the file as saved, and return how many there were.
+
+        A journal for another version of the file is deleted. A line cut short by a crash ends the replay, and is
+        removed from the journal.
+        """
+        import json
+
+        if not self.has_edits():
+            self._remove()
+            return 0
+
+        count = 0
+        with open(self.journal_path, 'r+b') as f:
+            f.readline()
+            for line in iter(f.readline, b''):
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete edit')
+                    start, removed, text = json.loads(line)
+                except ValueError:
+                    # drop the rest, so edits appended from here on are not lost behind it.
+                    f.truncate(f.tell() - len(line))
+                    break
+                buffer.replace(start, removed, text)
+                count += 1
+        return count
+
+    def record(self, buffer: Buffer, edit: Edit) -> None:
+        """Append `edit`, just made to `buffer`."""
+        import json
+
+        if self._file is None:
+            exists = self.has_edits()
+            self._file = open(self.journal_path, 'a' if exists else 'w', encoding='utf-8')
+            if not exists:
+                self._file.write(json.dumps(self._header) + '\n')
+        text = buffer.get_text(edit.start, edit.start + edit.inserted)
+        self._file.write(json.dumps([edit.start, edit.removed, text]) + '\n')
+        if self._unsynced_since is None:
+            self._unsynced_since = time.monotonic()
+
+    def sync(self, force=False) -> None:
+        """Hand the edits written so far to the system, so they outlive the editor.
+
+        They are synced to disk, to outlive the machine too, once the oldest has waited `SYNC_INTERVAL` seconds, or
+        straight away with `force`.
+        """
+        if self._file is None:
+            return
+        self._file.flush()
+        if self.pending and (force or time.monotonic() - self._unsynced_since >= self.SYNC_INTERVAL):
+            os.fsync(self._file.fileno())
+            self._unsynced_since = None
+
+    def reset(self) -> None:
+        """Start afresh from the file as it is now on disk, such as after saving it."""
+        self.close()
+        self._remove()
+        self._header = self._stat()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync(force=True)
+            self._file.close()
+            self._file = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def _remove(self):
+        try:
+            os.unlink(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+
+# the columns between tab stops.
+TAB_SIZE = 8
+# lines longer than this are shown a column per character, tabs included, as mapping them means reading them whole.
+LONG_LINE = 1 << 16
+
+
+@functools.lru_cache(maxsize=None)
+def _wcwidth():
+    """`wcwidth.wcwidth` if the package is installed, else None, importing it only the first time it is asked for."""
+    try:
+        from wcwidth import wcwidth
+    except ImportError:
+        return None
+    return wcwidth
+
+
+@functools.lru_cache(maxsize=None)
+def _char_width(char):
+    """The columns `char` takes up on a terminal: 0 for combining marks and the like, 2 for wide characters.
+
+    Uses `wcwidth` if it is installed, as it follows newer versions of Unicode than `unicodedata` may.
+    """
+    wcwidth = _wcwidth()
+    if wcwidth is not None:
+        width = wcwidth(char)
+    else:
+        category = unicodedata.category(char)
+        if category == 'Cc':
+            width = -1
+        elif category in ('Mn', 'Me', 'Cf'):
+            width = 0
+        else:
+            width = 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+    # curses shows control characters as ^X.
+    return 2 if width < 0 else width
+
+
+# bytes that were not valid UTF-8 are held as lone surrogates, which cannot be written to the terminal.
+_UNDECODED = {surrogate: '\ufffd' for surrogate in range(0xDC80, 0xDD00)}
+
+
+class LineColumns:
+    """Where each character of a line is shown on screen, allowing for tab stops, wide characters and graphemes.
+
+    A grapheme is a character together with any zero-width characters that follow it, such as combining marks, and
+    anything joined on with a zero-width joiner. The cursor only ever stops at the start of one. Lines of plain ASCII
+    without tabs, by far the most common, map every character to its own column without storing anything.
+    """
+
+    __slots__ = ('_length', '_columns', '_starts')
+
+    def __init__(self, text: str) -> None:
+        self._length = len(text)
+        self._columns = self._starts = None
+        if text.isascii() and '\t' not in text:
+            return
+        self._map(text)
+
+    @classmethod
+    def plain(cls, length: int) -> 'LineColumns':
+        """Columns for a line of `length` characters, shown a column per character without looking at them."""
+        columns = cls('')
+        columns._length = length
+        return columns
+
+    def _map(self, text):
+        # the column each character starts at, and whether it starts a grapheme, plus a final entry for the end.
+        columns = [0] * (len(text) + 1)
+        starts = bytearray(b'\x01') * (len(text) + 1)
+        column = 0
+        joined = False
+        for index, char in enumerate(text):
+            columns[index] = column
+            width = TAB_SIZE - column % TAB_SIZE if char == '\t' else _char_width(char)
+            if index and (width == 0 or joined):
+                starts[index] = 0
+            joined = char == '\u200d'
+            column += width
+        columns[-1] = column
+        self._columns = columns
+        self._starts = starts
+
+    @property
+    def width(self) -> int:
+        return self.column(self._length)
+
+    def column(self, index: int) -> int:
+        """The column the character at `index` starts at, or where the line ends for an index past its end."""
+        index = min(index, self._length)
+        return index if self._columns is None else self._columns[index]
+
+    def index(self, column: int) -> int:
+        """The index of the grapheme shown at `column`, or of the end of the line if it is shorter than that."""
+        if self._columns is None:
+            return min(column, self._length)
+        index = bisect.bisect_right(self._columns, column) - 1
+        return self.previous(index + 1) if index < self._length else self._length
+
+    def next(self, index: int) -> int:
+        """The index of the grapheme after the one at `index`, or the end of the line."""
+        if index >= self._length:
+            return self._length
+        index += 1
+        if self._starts is not None:
+            while not self._starts[index]:
+                index += 1
+        return index
+
+    def previous(self, index: int) -> int:
+        """The index of the grapheme before `index`, or 0."""
+        if index <= 0:
+            return 0
+        index = min(index, self._length) - 1
+        if self._starts is not None:
+            while not self._starts[index]:
+                index -= 1
+        return index
+
+    def render(self, text: str, start: int = 0) -> str:
+        """`text`, the part of the line from `start` on, as it is shown, with tabs as spaces."""
+        if not text.isascii():
+            text = text.translate(_UNDECODED)
+        if '\t' not in text:
+            return text
+        if self._columns is None:
+            return text.replace('\t', ' ')
+        columns = self._columns
+        return ''.join(
+            ' ' * (columns[index + 1] - columns[index]) if char == '\t' else char
+            for index, char in enumerate(text, start)
+        )
+
+    def window(self, left: int, width: int):
+        """The `(start, stop, padding)` of the characters to show between columns `left` and `left + width`.
+
+        Graphemes that only partly fit are left out, and `padding` is the blank columns a wide one leaves at the left.
+        """
+        start = self.index(left)
+        padding = 0
+        if self.column(start) < left:
+            start = self.next(start)
+            padding = self.column(start) - left
+        # the grapheme shown at the first column past the window either starts there or runs off the right edge.
+        stop = self.index(left + width)
+        return start, max(stop, start), padding
+
+
+class ColumnCache:
+    """The `LineColumns` of the most recently used lines of a buffer, each kept until the line is edited."""
+
+    SIZE = 1024
+
+    def __init__(self, buffer: Buffer) -> None:
+        self._buffer = buffer
+        self._lines = collections.OrderedDict()
+
+    def __getitem__(self, line: int) -> LineColumns:
+        columns = self._lines.get(line)
+        if columns is None:
+            length = self._buffer.line_length(line)
+            if length > LONG_LINE:
+                columns = LineColumns.plain(length)
+            else:
+                columns = LineColumns(self._buffer.get_line(line))
+            self._lines[line] = columns
+            if len(self._lines) > self.SIZE:
+                self._lines.popitem(last=False)
+        else:
+            self._lines.move_to_end(line)
+        return columns
+
+    def update(self, edit: Edit) -> None:
+        """Forget the lines `edit` touched, and move those after it to their new line numbers."""
+        last = edit.line + edit.removed_lines
+        shift = edit.inserted_lines - edit.removed_lines
+        if shift:
+            self._lines = collections.OrderedDict(
+                (line + shift if line > last else line, columns)
+                for line, columns in self._lines.items() if not edit.line <= line <= last
+            )
+        else:
+            for line in range(edit.line, last + 1):
+                self._lines.pop(line, None)
+
 
 @dataclass
 class FilePosition:
@@ -112,6 +1398,7 @@ class File:
     def __init__(self, buffer: Buffer, position: FilePosition) -> None:
         self._buffer = buffer
         self._position = position
+        self.columns = ColumnCache(buffer)
 
     @property
     def char_pos(self) -> int:
@@ -129,63 +1416,455 @@ class File:
     def line_pos(self, value: int) -> None:
         self._position.y = value
 
+    @property
+    def column(self) -> int:
+        """The screen column of the cursor within its line."""
+        return self.columns[self.line_pos].column(self.char_pos)
+
     def get_char(self):
-        for index, line in enumerate(str(self._buffer).splitlines()):
-            if index == self.line_pos:
-                return line[self.char_pos]
+        if self.line_pos < self._buffer.line_count():
+            return self._buffer.get_line(self.line_pos, self.char_pos, self.char_pos + 1)
 
     def write_char(self, char):
+        index = self._buffer.offset_of(self.line_pos, self.char_pos)
 
-        def accumulate():
-            accumulator = 0
-            for line_num, line in enumerate(str(self._buffer).splitlines()):
-                for char_num, char_ in enumerate(line + '\n'):
-                    if line_num == self.line_pos and char_num == self.char_pos:
-                        break
-                    accumulator += 1
-            return accumulator
-
-        index = accumulate()
-
-        self._buffer.insert(char, index)
+        edit = self._edited(self._buffer.insert(char, index, group=True))
         if char == '\n':
             self.char_pos = 0
             self.move_down()
         else:
             self.move_right()
+        return edit
+
+    def write_text(self, text):
+        index = self._buffer.offset_of(self.line_pos, self.char_pos)
+
+        edit = self._edited(self._buffer.insert(text, index, group=True))
+        self._move_to(index + len(text))
+        return edit
+
+    def backspace(self):
+        index = self._buffer.offset_of(self.line_pos, self.char_pos)
+        if index == 0:
+            return None
+
+        edit = self._edited(self._buffer.delete(index - 1, 1))
+        self._move_to(index - 1)
+        return edit
+
+    def delete_char(self):
+        index = self._buffer.offset_of(self.line_pos, self.char_pos)
+        if index >= len(self._buffer):
+            return None
+
+        # take the whole grapheme, so no combining marks are left behind. at the end of a line, take the newline.
+        length = max(self.columns[self.line_pos].next(self.char_pos) - self.char_pos, 1)
+        return self._edited(self._buffer.delete(index, length))
+
+    def undo(self):
+        edit = self._edited(self._buffer.undo())
+        if edit is not None:
+            self._move_to(edit.start)
+        return edit
+
+    def redo(self):
+        edit = self._edited(self._buffer.redo())
+        if edit is not None:
+            self._move_to(edit.start + edit.inserted)
+        return edit
+
+    def loaded(self, edit):
+        """Take note of `edit`, made straight to the buffer as more of the file was loaded."""
+        return self._edited(edit)
+
+    def _edited(self, edit):
+        if edit is not None:
+            self.columns.update(edit)
+        return edit
+
+    def find(self, pattern, start=None, regex=False):
+        """Move to the next match of `pattern` from `start`, or the cursor, wrapping around to the start of the file.
+
+        Returns the new position, or None if there is no match.
+        """
+        if start is None:
+            start = self._buffer.offset_of(self.line_pos, self.char_pos)
+        offset = self._buffer.find(pattern, start, regex)
+        if offset is None and start > 0:
+            offset = self._buffer.find(pattern, 0, regex)
+        if offset is None:
+            return None
+        self._move_to(offset)
+        return self._position
+
+    def find_next(self, index: SearchIndex):
+        """Move to the next occurrence held by `index`, returning the new position or None if there is none."""
+        offset = index.next_after(self._buffer.offset_of(self.line_pos, self.char_pos))
+        if offset is None:
+            return None
+        self._move_to(offset)
+        return self._position
+
+    def _move_to(self, offset):
+        self.line_pos = self._buffer.line_of(offset)
+        self.char_pos = offset - self._buffer.line_start(self.line_pos)
 
     def move_left(self):
-        if self.char_pos > 0:
-            self.char_pos -= 1
-        logging.debug(f'file.move_left : {self._position}')
+        self.char_pos = self.columns[self.line_pos].previous(self.char_pos)
 
     def move_right(self):
-        for line_num, line in enumerate(str(self._buffer).splitlines()):
-            if line_num == self.line_pos:
-                if self.char_pos < len(line):
-                    self.char_pos += 1
-        logging.debug(f'file.move_right : {self._position}')
+        self.char_pos = self.columns[self.line_pos].next(self.char_pos)
 
-    def move_down(self):
-        lines = 0
-        for char in str(self._buffer):
-            if char == '\n':
-                lines += 1
-        if self.line_pos < lines:
-            self.line_pos += 1
+    def move_home(self):
+        self.char_pos = 0
 
-        for line_num, line in enumerate(str(self._buffer).splitlines()):
-            if line_num == self.line_pos:
-                line_len = len(line)
-                if self.char_pos > line_len:
-                    self.char_pos = line_len
+    def move_end(self):
+        self.char_pos = self._buffer.line_length(self.line_pos)
 
-        logging.debug(f'file.move_down : {self._position}')
+    def move_down(self):
+        if self.line_pos < self._buffer.line_count() - 1:
+            self._move_to_line(self.line_pos + 1)
+        else:
+            self.char_pos = min(self.char_pos, self._buffer.line_length(self.line_pos))
 
     def move_up(self):
         if self.line_pos > 0:
-            self.line_pos -= 1
-        logging.debug(f'file.move_up : {self._position}')
+            self._move_to_line(self.line_pos - 1)
+
+    def _move_to_line(self, line):
+        # stay in the same screen column, or as near as the new line allows.
+        column = self.column
+        self.line_pos = line
+        self.char_pos = self.columns[line].index(column)
+
+
+class OpenFile:
+    """A file open in the editor: where it lives, where the cursor and view are, and, while resident, its buffer."""
+
+    def __init__(self, path, buffer: Buffer, loader=None, journal=None) -> None:
+        self.path = path
+        self.journal = journal
+        self.position = FilePosition.origin()
+        # the top and left of the viewport, kept while another file is shown.
+        self.scroll = (0, 0)
+        self.loader = loader
+        self.buffer = buffer
+        self.file = File(buffer, self.position)
+        self.highlighter = Highlighter.for_path(path, buffer)
+        # set on restore if the file was changed by something else while evicted.
+        self.changed_on_disk = False
+        self._disk_state = None
+
+    @property
+    def resident(self) -> bool:
+        return self.buffer is not None
+
+    def evict(self) -> None:
+        self.buffer.close()
+        self.buffer = self.file = self.highlighter = None
+        self._disk_state = _disk_state(self.path)
+
+    def restore(self) -> None:
+        # only unmodified files are evicted, so the file on disk still holds the text. it is read the way
+        # `BufferManager.open` reads it, only without a worker thread, so it comes back just as it was.
+        buffer = Buffer.from_file(self.path)
+        # the cursor is kept either way, but if the file changed while evicted it may no longer mean the same place.
+        self.changed_on_disk = _disk_state(self.path) != self._disk_state
+        self.buffer = buffer
+        self.file = File(self.buffer, self.position)
+        self.highlighter = Highlighter.for_path(self.path, self.buffer)
+
+
+def _disk_state(path):
+    """The size and modification time of the file at `path`, or None if it cannot be found."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class BufferManager:
+    """The files open in the editor, keeping the recently used ones resident within a memory budget.
+
+    Once the resident buffers hold more than `budget` bytes, the least recently used files that have no unsaved
+    changes are evicted, dropping their buffers until they are switched to again. The current file is never evicted.
+    """
+
+    BUDGET = 256 << 20
+
+    def __init__(self, budget=None) -> None:
+        self.budget = budget if budget is not None else self.BUDGET
+        # keyed by path, from least to most recently used.
+        self._files = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self):
+        return iter(self._files.values())
+
+    @property
+    def current(self):
+        """The most recently used file, or None if none are open."""
+        return next(reversed(self._files.values()), None)
+
+    def open(self, path=None) -> OpenFile:
+        """Open `path` and make it current, switching to it if it is already open.
+
+        A path that does not exist yet, or None, opens an empty buffer. Files at least `BACKGROUND_LOAD_THRESHOLD`
+        bytes are read on a worker thread, or from `Buffer.MMAP_THRESHOLD` bytes mapped and counted on one, left on
+        the entry's `loader`. Edits left in the file's journal by an editor that never saved them are recovered.
+        """
+        if path in self._files:
+            return self.switch(path)
+
+        loader = None
+        journal = Journal(path) if path is not None else None
+        if path is None or not os.path.exists(path):
+            buffer = Buffer()
+        elif os.path.getsize(path) >= BACKGROUND_LOAD_THRESHOLD and not journal.has_edits():
+            if os.path.getsize(path) >= Buffer.MMAP_THRESHOLD:
+                text = MappedText(path, lazy=True)
+                buffer, loader = Buffer(text), MappedLoader(text)
+            else:
+                buffer, loader = Buffer(), FileLoader(path)
+            loader.drain(buffer, wait=True)
+        else:
+            buffer = Buffer.from_file(path)
+        if journal is not None:
+            journal.recover(buffer)
+
+        self._files[path] = OpenFile(path, buffer, loader, journal)
+        self._evict()
+        return self._files[path]
+
+    def switch(self, path) -> OpenFile:
+        """Make the open file at `path` current, restoring its buffer if it was evicted.
+
+        If it cannot be read back, the error is raised and the file is closed, leaving the current file as it was.
+        """
+        entry = self._files[path]
+        if not entry.resident:
+            self._restore(entry)
+        self._files.move_to_end(path)
+        self._evict()
+        return entry
+
+    def next(self):
+        """Switch to the least recently used file, so repeated calls cycle through them all. Returns it, or None."""
+        if not self._files:
+            return None
+        return self.switch(next(iter(self._files)))
+
+    def close(self, path):
+        """Forget the open file at `path`, without saving it, and return the new current file or None.
+
+        If it has unsaved changes its journal is kept, so they are recovered when it is next opened. The file that
+        becomes current is restored first: if it cannot be read back, the error is raised, that file is closed instead
+        and `path` stays open and current.
+        """
+        entry = self._files[path]
+        following = next((other for other in reversed(self._files.values()) if other is not entry), None)
+        if following is not None and not following.resident:
+            self._restore(following)
+        del self._files[path]
+        if entry.journal is not None:
+            if entry.resident and entry.buffer.modified:
+                entry.journal.close()
+            else:
+                entry.journal.reset()
+        if entry.resident:
+            entry.evict()
+        return self.current
+
+    def resident_size(self) -> int:
+        return sum(entry.buffer.resident_size() for entry in self._files.values() if entry.resident)
+
+    def _evict(self):
+        size = self.resident_size()
+        current = self.current
+        for entry in list(self._files.values()):
+            if size <= self.budget:
+                break
+            # a file with no path, not yet saved, with edits or still loading would lose text if its buffer were
+            # dropped.
+            if entry is current or not entry.resident or entry.path is None or entry.loader is not None:
+                continue
+            if not os.path.exists(entry.path):
+                continue
+            if entry.buffer.modified:
+                continue
+            size -= entry.buffer.resident_size()
+            entry.evict()
+
+    def _restore(self, entry):
+        try:
+            entry.restore()
+        except BaseException:
+            # only files without unsaved changes are evicted, so nothing is lost by forgetting one that is gone.
+            del self._files[entry.path]
+            if entry.journal is not None:
+                entry.journal.reset()
+            raise
+
+
+################
+# highlighting #
+################
+
+class PythonLexer:
+    """Splits lines of Python into tokens.
+
+    The state carried from one line to the next is the quote of an unterminated triple-quoted string, or None.
+    """
+
+    KEYWORDS = frozenset(keyword.kwlist)
+    TOKEN = re.compile(
+        r'(?P<comment>#.*)'
+        r'|(?P<triple>[rRbBuUfF]{0,2}(?:"""|\'\'\'))'
+        r'|(?P<string>[rRbBuUfF]{0,2}(?:"(?:\\.|[^"\\])*"?|\'(?:\\.|[^\'\\])*\'?))'
+        r'|(?P<number>\b\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?[jJ]?)'
+        r'|(?P<name>[^\W\d]\w*)'
+    )
+
+    def lex(self, line, state=None):
+        """Return the `(start, stop, kind)` tokens of `line`, lexed from `state`, and the state it ends in."""
+        tokens = []
+        position = 0
+        if state is not None:
+            end = line.find(state)
+            if end < 0:
+                return [(0, len(line), 'string')], state
+            position = end + 3
+            tokens.append((0, position, 'string'))
+
+        for match in self.TOKEN.finditer(line, position):
+            kind = match.lastgroup
+            start, stop = match.span()
+            if start < position:
+                # inside the rest of a triple-quoted string that started on this line.
+                continue
+            if kind == 'triple':
+                quote = match.group()[-3:]
+                end = line.find(quote, stop)
+                if end < 0:
+                    tokens.append((start, len(line), 'string'))
+                    return tokens, quote
+                stop = end + 3
+                kind = 'string'
+            elif kind == 'name':
+                if match.group() not in self.KEYWORDS:
+                    continue
+                kind = 'keyword'
+            tokens.append((start, stop, kind))
+            position = stop
+        return tokens, None
+
+
+# lexers by file extension.
+LEXERS = {'.py': PythonLexer}
+
+
+class Highlighter:
+    """Incremental syntax highlighting, caching the lexer state at the start of each line.
+
+    Lines are only lexed as far down as they are drawn, so the visible lines come first and nothing below them is
+    touched. After an edit, lines are re-lexed from the edited one only until their state matches the cached state
+    again, so a keystroke usually costs a line or two. Lines far below those lexed so far are drawn plain at first,
+    and `catch_up` lexes down to them a step at a time between keys.
+    """
+
+    # the most lines re-lexed after an edit before the cache beyond is dropped, to be rebuilt when next drawn.
+    RELEX_LIMIT = 1000
+    # the most lines lexed at once to reach a line below the cached states, as it takes milliseconds per thousand.
+    LEX_STEP = 2000
+
+    def __init__(self, buffer: Buffer, lexer) -> None:
+        self._buffer = buffer
+        self._lexer = lexer
+        # the state at the start of each line, known for the first len(self._states) lines.
+        self._states = [None]
+        # the furthest line asked for, which may not have been lexed yet.
+        self._wanted = 0
+
+    @classmethod
+    def for_path(cls, path, buffer: Buffer):
+        """A highlighter for `buffer` chosen by the extension of `path`, or None if there is no lexer for it."""
+        lexer = LEXERS.get(os.path.splitext(path)[1]) if path is not None else None
+        return cls(buffer, lexer()) if lexer is not None else None
+
+    @property
+    def behind(self) -> bool:
+        """Whether a line was drawn without highlighting because it is too far below those lexed so far."""
+        return len(self._states) <= min(self._wanted, self._buffer.line_count() - 1)
+
+    def tokens(self, line: int):
+        """Return the `(start, stop, kind)` tokens of `line`, or none if it is too far down to lex straight away.
+
+        Lines longer than `LONG_LINE` are not highlighted, and are taken to leave the state as they found it.
+        """
+        if line >= len(self._states) + self.LEX_STEP:
+            self._wanted = max(self._wanted, line)
+            return []
+        state = self._state_at(line)
+        if self._buffer.line_length(line) > LONG_LINE:
+            return []
+        return self._lexer.lex(self._buffer.get_line(line), state)[0]
+
+    def catch_up(self) -> bool:
+        """Lex up to `LEX_STEP` more lines towards those drawn without highlighting. Returns whether more remain."""
+        wanted = min(self._wanted, self._buffer.line_count() - 1)
+        self._state_at(min(len(self._states) - 1 + self.LEX_STEP, wanted))
+        return self.behind
+
+    def _lex(self, line, state):
+        # the state a line ends in.
+        if self._buffer.line_length(line) > LONG_LINE:
+            return state
+        return self._lexer.lex(self._buffer.get_line(line), state)[1]
+
+    def update(self, edit: Edit) -> int:
+        """Bring the cached states up to date with `edit`.
+
+        Returns the line after the last one whose highlighting may have changed, beyond those the edit touched.
+        """
+        states = self._states
+        if len(states) <= edit.line:
+            return edit.line
+
+        # a line after those the edit touched had its cached state at `line - shift` before it.
+        last = edit.line + edit.inserted_lines
+        shift = edit.inserted_lines - edit.removed_lines
+        relexed = []
+        line_count = self._buffer.line_count()
+        line = edit.line
+        state = states[line]
+        while line + 1 < line_count:
+            if line - edit.line >= self.RELEX_LIMIT:
+                states[edit.line + 1:] = relexed
+                return line_count
+            state = self._lex(line, state)
+            line += 1
+            relexed.append(state)
+            if line > last:
+                old = line - shift
+                if old >= len(states):
+                    # no line this far down has been lexed, so none has been drawn either.
+                    break
+                if states[old] == state:
+                    # the states from here on are as cached, so splice in the new ones before them and stop.
+                    states[edit.line + 1:old + 1] = relexed
+                    return line
+        states[edit.line + 1:] = relexed
+        return line + 1
+
+    def _state_at(self, line):
+        states = self._states
+        while len(states) <= line:
+            index = len(states) - 1
+            states.append(self._lex(index, states[index]))
+        return states[line]
 
 
 ##########
@@ -193,82 +1872,736 @@ class File:
 ##########
 
 NEW_FILE_NAME = '< new file >'
-
-
-def _write_header(stdscr, filename=None):
+# where a new file is saved, as it has no name of its own.
+NEW_FILE_SAVE_PATH = 'outfile'
+
+# files at least this large, but not large enough to map, are loaded on a worker thread.
+BACKGROUND_LOAD_THRESHOLD = 1 << 20
+# how often, in milliseconds, to show more of a file while it loads.
+LOAD_POLL_INTERVAL = 50
+
+KEY_UNDO = '\x15'  # ctrl-u
+KEY_REDO = '\x12'  # ctrl-r
+KEYS_BACKSPACE = {'KEY_BACKSPACE', '\x7f', '\b'}
+KEY_DELETE = 'KEY_DC'
+KEY_SEARCH = '\x06'  # ctrl-f
+KEY_FIND_NEXT = '\x0e'  # ctrl-n
+KEY_ESCAPE = '\x1b'
+KEY_ENTER = '\n'
+KEY_OPEN = '\x0f'  # ctrl-o
+KEY_NEXT_FILE = '\x14'  # ctrl-t
+KEY_CLOSE = '\x17'  # ctrl-w
+MOVEMENT_KEYS = {'KEY_LEFT', 'KEY_RIGHT', 'KEY_UP', 'KEY_DOWN', 'KEY_HOME', 'KEY_END'}
+# keys that are acted on rather than typed.
+COMMAND_KEYS = {
+    *MOVEMENT_KEYS, KEY_UNDO, KEY_REDO, KEY_DELETE, KEY_SEARCH, KEY_FIND_NEXT, KEY_OPEN, KEY_NEXT_FILE, KEY_CLOSE, 'q',
+    *KEYS_BACKSPACE,
+}
+
+
+def _write_header(stdscr, width, filename=None):
 
     title = filename if filename is not None else NEW_FILE_NAME
-    padding = ' ' * math.floor((curses.COLS / 2) - (len(title) / 2))
+    padding = ' ' * math.floor((width / 2) - (len(title) / 2))
     header = f'{padding}{title}{padding}'
-    diff = curses.COLS - len(header)
+    diff = width - len(header)
     header += ' ' * diff
 
+    import curses
     stdscr.addstr(0, 0, header, curses.A_REVERSE)
 
 
-def _write_content(stdscr, buffer):
-    lines = str(buffer).splitlines()
-    for line_number, line in enumerate(lines, start=1):  # include offset for header.
-        if line_number < curses.LINES - 2:  # less one line for the header and footer each.
-            stdscr.move(line_number, 0)
-            stdscr.addstr(line)
+@dataclass
+class Viewport:
+    """The window of the file that is visible on screen."""
+
+    top: int
+    left: int
+    height: int
+    width: int
+
+    def follow(self, line: int, col: int) -> None:
+        """Scroll just far enough that the given position is visible."""
+        if line < self.top:
+            self.top = line
+        elif line >= self.top + self.height:
+            self.top = line - self.height + 1
+
+        if col < self.left:
+            self.left = col
+        elif col >= self.left + self.width:
+            self.left = col - self.width + 1
+
+
+def _write_content(stdscr, buffer, viewport, lines, columns, highlighter=None, styles=None):
+    line_count = buffer.line_count()
+    for line_number in lines:
+        stdscr.move(line_number - viewport.top + 1, 0)  # include offset for header.
+        stdscr.clrtoeol()
+        if line_number < line_count:
+            line_columns = columns[line_number]
+            start, stop, padding = line_columns.window(viewport.left, viewport.width)
+            # read only the part of the line that is on screen.
+            text = buffer.get_line(line_number, start, stop)
+            if padding:
+                stdscr.addstr(' ' * padding)
+            if highlighter is None:
+                stdscr.addstr(line_columns.render(text, start))
+            else:
+                tokens = highlighter.tokens(line_number)
+                _write_tokens(stdscr, text, start, line_columns, tokens, styles or {})
+
+
+def _write_tokens(stdscr, text, start, columns, tokens, styles):
+    # `text` is the visible part of the line, from `start`, and token offsets are from the start of the line.
+    stop = start + len(text)
+    position = start
+    for token_start, token_stop, kind in tokens:
+        token_start, token_stop = max(token_start, position), min(token_stop, stop)
+        if token_start >= token_stop:
+            continue
+        if token_start > position:
+            stdscr.addstr(columns.render(text[position - start:token_start - start], position))
+        stdscr.addstr(columns.render(text[token_start - start:token_stop - start], token_start), styles.get(kind, 0))
+        position = token_stop
+    if position < stop:
+        stdscr.addstr(columns.render(text[position - start:], position))
+
+
+def _token_styles():
+    """The attribute to draw each kind of token with, or none at all when there is no terminal to ask about colour."""
+    import curses
+    try:
+        if not curses.has_colors():
+            return {'keyword': curses.A_BOLD, 'comment': curses.A_DIM}
+        curses.use_default_colors()
+    except curses.error:
+        return {}
+
+    colours = {'keyword': curses.COLOR_BLUE, 'string': curses.COLOR_GREEN, 'comment': curses.COLOR_CYAN,
+               'number': curses.COLOR_MAGENTA}
+    styles = {}
+    for pair, (kind, colour) in enumerate(colours.items(), 1):
+        curses.init_pair(pair, colour, -1)
+        styles[kind] = curses.color_pair(pair)
+    return styles
+
+
+def _write_footer(stdscr, row, width, status, progress=None):
+    import curses
+    loading = f'loading {progress}% ' if progress is not None else ''
+    footer = f"{status}{' ' * (width - len(status) - len(loading))}{loading}"
+    stdscr.insstr(row, 0, footer, curses.A_REVERSE)
+
+
+class Renderer:
+    """Draws frames, repainting only the parts of the screen that changed since the last one."""
+
+    HEADER_OFFSET = 1
+
+    def __init__(self, stdscr, viewport: Viewport, doupdate=None, highlighter=None, styles=None) -> None:
+        if doupdate is None:
+            import curses
+            doupdate = curses.doupdate
+        self._stdscr = stdscr
+        self._viewport = viewport
+        self._doupdate = doupdate
+        self.highlighter = highlighter
+        self._styles = styles
+        self._title = None
+        self._status = None
+        self._drawn_at = None
+        self._dirty = set()
+
+    def damage(self, edit: Edit) -> None:
+        """Mark the lines touched by `edit` for redrawing."""
+        if edit.inserted_lines != edit.removed_lines:
+            # every line below the edit has moved.
+            stop = self._viewport.top + self._viewport.height
+        else:
+            stop = edit.line + edit.inserted_lines + 1
+        if self.highlighter is not None:
+            # the edit may have changed how the lines after it are highlighted, without touching their text.
+            stop = max(stop, min(self.highlighter.update(edit), self._viewport.top + self._viewport.height))
+        self._dirty.update(range(edit.line, stop))
+
+    def draw(self, buffer: Buffer, file: File, filename=None, status='q to quit', progress=None) -> None:
+        """Draw a frame, with `progress` as the percentage of the file loaded so far while it is still loading."""
+        viewport = self._viewport
+        column = file.column
+        viewport.follow(file.line_pos, column)
+
+        if filename != self._title or self._drawn_at is None:
+            _write_header(self._stdscr, viewport.width, filename)
+            self._title = filename
+
+        visible = range(viewport.top, viewport.top + viewport.height)
+        if (viewport.top, viewport.left) != self._drawn_at:
+            lines = visible
+        else:
+            lines = sorted(line for line in self._dirty if line in visible)
+        _write_content(self._stdscr, buffer, viewport, lines, file.columns, self.highlighter, self._styles)
+        self._dirty.clear()
+
+        if (status, progress) != self._status or self._drawn_at is None:
+            _write_footer(self._stdscr, viewport.height + self.HEADER_OFFSET, viewport.width, status, progress)
+            self._status = (status, progress)
+
+        self._drawn_at = (viewport.top, viewport.left)
+        self._stdscr.move(file.line_pos - viewport.top + self.HEADER_OFFSET, column - viewport.left)
+
+    def invalidate(self) -> None:
+        """Forget what is on screen, so the next frame is drawn in full."""
+        self._drawn_at = None
+        self._dirty.clear()
+
+    def refresh(self) -> None:
+        """Send the drawn frame to the terminal."""
+        self._stdscr.noutrefresh()
+        self._doupdate()
+
+
+class HeadlessScreen:
+    """A stand-in for a curses window that reads keys from a list and draws nothing.
+
+    Lets `curses_main` run, and be measured, without a terminal. Running out of keys ends it with `EOFError`.
+    """
+
+    def __init__(self, keys, lines=24, cols=80) -> None:
+        self._keys = collections.deque(keys)
+        self._size = (lines, cols)
+        self._nodelay = False
+        self._timeout = -1
+
+    def getmaxyx(self):
+        return self._size
+
+    def getkey(self):
+        if self._keys:
+            return self._keys.popleft()
+        if self._nodelay or self._timeout >= 0:
+            import curses
+            raise curses.error('no input')
+        raise EOFError('no more keys')
+
+    def nodelay(self, flag):
+        self._nodelay = flag
+
+    def timeout(self, delay):
+        self._timeout = delay
+
+    def doupdate(self):
+        pass
+
+    def move(self, row, col):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def addstr(self, *args):
+        pass
+
+    def insstr(self, *args):
+        pass
+
+    def noutrefresh(self):
+        pass
+
 
+class RecordingScreen:
+    """Wraps a curses window, logging every key read from it to `trace` as a line of JSON.
 
-def _write_footer(stdscr):
-    status = 'q to quit'
-    footer = f"{status}{' ' * (curses.COLS - len(status))}"
-    stdscr.insstr(curses.LINES - 1, 0, footer, curses.A_REVERSE)
+    Each line holds the key, the seconds since recording began, and whether it was already waiting when read
+    (`pending`), so a replay can batch keys the same way.
+    """
+
+    def __init__(self, stdscr, trace) -> None:
+        self._stdscr = stdscr
+        self._trace = trace
+        self._start = time.monotonic()
+        self._nodelay = False
+
+    def __getattr__(self, name):
+        return getattr(self._stdscr, name)
+
+    def nodelay(self, flag):
+        self._nodelay = flag
+        self._stdscr.nodelay(flag)
+
+    def getkey(self):
+        import json
+
+        key_value = self._stdscr.getkey()
+        entry = {'time': round(time.monotonic() - self._start, 6), 'key': key_value, 'pending': self._nodelay}
+        self._trace.write(json.dumps(entry) + '\n')
+        return key_value
+
+
+class ReplayScreen(HeadlessScreen):
+    """A headless screen fed from a recorded trace, timing how long the editor takes to handle each key.
+
+    A key's latency runs from handing it over until the editor next waits for input, so it covers applying the key
+    and any others that were pending with it, and drawing the frame.
+    """
+
+    def __init__(self, entries, lines=24, cols=80) -> None:
+        super().__init__([], lines, cols)
+        self._entries = collections.deque(entries)
+        self._handed_over = None
+        self.latencies = []
+
+    def getkey(self):
+        if self._nodelay:
+            if self._entries and self._entries[0]['pending']:
+                return self._entries.popleft()['key']
+            import curses
+            raise curses.error('no input')
+
+        now = time.perf_counter()
+        if self._handed_over is not None:
+            self.latencies.append(now - self._handed_over)
+        if not self._entries:
+            raise EOFError('end of trace')
+        key_value = self._entries.popleft()['key']
+        self._handed_over = time.perf_counter()
+        return key_value
+
+
+def replay(trace_path, filename=None, profiler=None):
+    """Replay a recorded trace against `filename`, as fast as possible, and return the key latencies."""
+    import json
+    import shutil
+    import tempfile
+
+    with open(trace_path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # work on a copy of the file, as the trace may well end by saving.
+        path = os.path.join(directory, os.path.basename(filename) if filename is not None else 'replay')
+        if filename is None:
+            open(path, 'w').close()
+        else:
+            shutil.copyfile(filename, path)
+
+        screen = ReplayScreen(entries)
+        try:
+            curses_main(screen, path, doupdate=screen.doupdate, profiler=profiler)
+        except EOFError:
+            pass
+        return screen.latencies
+
+
+def _format_latencies(latencies):
+    ordered = sorted(latencies)
+
+    def percentile(fraction):
+        return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)] * 1000
+
+    if not ordered:
+        return 'no keys replayed'
+    return (
+        f'keys: {len(ordered)}  p50: {percentile(0.5):.3f}ms  p99: {percentile(0.99):.3f}ms  '
+        f'max: {ordered[-1] * 1000:.3f}ms'
+    )
+
+
+class IncrementalSearch:
+    """Search as you type: each key edits the query and jumps to its first match from where the search began."""
+
+    def __init__(self, file: File) -> None:
+        self.query = ''
+        self._file = file
+        self._origin = FilePosition(x=file.char_pos, y=file.line_pos)
+
+    @property
+    def status(self) -> str:
+        return f'search: {self.query}'
+
+    def handle(self, key_value: str) -> bool:
+        """Act on a key, returning False once the search is over."""
+        if key_value == KEY_ENTER:
+            return False
+        if key_value == KEY_ESCAPE:
+            self._return_to_origin()
+            return False
+
+        if key_value in KEYS_BACKSPACE:
+            self.query = self.query[:-1]
+        elif len(key_value) == 1:
+            self.query += key_value
+
+        self._return_to_origin()
+        if self.query:
+            self._file.find(self.query)
+        return True
+
+    def _return_to_origin(self):
+        self._file.char_pos = self._origin.x
+        self._file.line_pos = self._origin.y
+
+
+class Prompt:
+    """A line of text typed into the footer, such as the path of a file to open."""
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.text = ''
+        self.accepted = False
+
+    @property
+    def status(self) -> str:
+        return f'{self.label}: {self.text}'
+
+    def handle(self, key_value: str) -> bool:
+        """Act on a key, returning False once the prompt is done, with `accepted` set if it was not cancelled."""
+        if key_value == KEY_ENTER:
+            self.accepted = True
+            return False
+        if key_value == KEY_ESCAPE:
+            return False
+
+        if key_value in KEYS_BACKSPACE:
+            self.text = self.text[:-1]
+        elif len(key_value) == 1:
+            self.text += key_value
+        return True
+
+
+#############
+# profiling #
+#############
+
+class Profiler:
+    """Timings of each phase of the main loop, kept in memory as histograms.
+
+    Each histogram counts timings in power-of-two microsecond buckets. When disabled, `phase` hands back a shared
+    no-op context manager, so the main loop does no timing or formatting at all.
+    """
+
+    PHASES = ('input', 'edit', 'render', 'refresh')
+
+    def __init__(self, enabled=False) -> None:
+        self.enabled = enabled
+        self._histograms = {phase: collections.Counter() for phase in self.PHASES}
+        self._totals = dict.fromkeys(self.PHASES, 0.0)
+        self._maxima = dict.fromkeys(self.PHASES, 0.0)
+
+    def phase(self, name):
+        return _Timing(self, name) if self.enabled else _NOT_TIMED
+
+    def record(self, name, seconds):
+        self._histograms[name][max(int(seconds * 1_000_000), 1).bit_length()] += 1
+        self._totals[name] += seconds
+        self._maxima[name] = max(self._maxima[name], seconds)
+
+    def summary(self) -> str:
+        """Return a table of each phase's count, mean, approximate p50 and p99, and max, in milliseconds."""
+        rows = [f"{'phase':<8}{'count':>8}{'mean':>10}{'p50':>10}{'p99':>10}{'max':>10}"]
+        for name in self.PHASES:
+            histogram = self._histograms[name]
+            count = sum(histogram.values())
+            if not count:
+                continue
+            rows.append(
+                f'{name:<8}{count:>8}{self._totals[name] / count * 1000:>10.3f}'
+                f'{self._percentile(histogram, count, 0.5):>10.3f}{self._percentile(histogram, count, 0.99):>10.3f}'
+                f'{self._maxima[name] * 1000:>10.3f}'
+            )
+        return '\n'.join(rows)
+
+    @staticmethod
+    def _percentile(histogram, count, fraction):
+        # the upper bound of the bucket holding the percentile, in milliseconds.
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= fraction * count:
+                return (1 << bucket) / 1000
+
+
+class _Timing:
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self._profiler.record(self._name, time.perf_counter() - self._start)
+
+
+_NOT_TIMED = contextlib.nullcontext()
 
 
 ########
 # main #
 ########
 
+def _env_flag(name):
+    """Whether the environment variable `name` is set to a true value, such as 1, true, yes or on."""
+    return os.environ.get(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 def main():
+    # the terminal UI is only needed when running the editor, so importing ted for its data structures stays cheap.
+    import argparse
+    import curses
+
     parser = argparse.ArgumentParser()
-    parser.add_argument('filename', nargs='?')
+    parser.add_argument('filenames', nargs='*', metavar='filename')
+    parser.add_argument('--record', metavar='TRACE', help='log every key pressed to TRACE')
+    parser.add_argument(
+        '--replay', metavar='TRACE', help='replay the keys in TRACE without a terminal and report key latencies',
+    )
+    parser.add_argument(
+        '--memory-budget', type=int, metavar='MB',
+        help='evict unmodified files not in use once open files hold more than MB megabytes',
+    )
+    parser.add_argument(
+        '--profile', action='store_true', default=_env_flag('TED_PROFILE'),
+        help='time each phase of the main loop and print a summary on exit (or set TED_PROFILE=1)',
+    )
     args = parser.parse_args()
-    curses.wrapper(curses_main, args.filename)
-    return 0
-
+    profiler = Profiler(enabled=args.profile)
+    budget = args.memory_budget << 20 if args.memory_budget is not None else None
+
+    if args.replay is not None:
+        if len(args.filenames) > 1:
+            parser.error('--replay takes at most one filename')
+        print(_format_latencies(replay(args.replay, next(iter(args.filenames), None), profiler)))
+    elif args.record is not None:
+        with open(args.record, 'w', buffering=1) as trace:
+            curses.wrapper(
+                lambda stdscr: curses_main(
+                    RecordingScreen(stdscr, trace), *args.filenames, profiler=profiler, budget=budget,
+                ),
+            )
+    else:
+        curses.wrapper(curses_main, *args.filenames, profiler=profiler, budget=budget)
 
-def curses_main(stdscr, filename=None):
+    if profiler.enabled:
+        print(profiler.summary(), file=sys.stderr)
+    return 0
 
-    if filename is not None:
-        with open(filename) as f:
-            buffer = Buffer(f.read())
-    else:
-        buffer = Buffer()
 
-    file = File(buffer, FilePosition.origin())
-    header_offset = 1
+def _read_keys(stdscr, timeout=None):
+    """Wait for a key, then drain any others already waiting, such as the rest of a paste.
+
+    With `timeout`, give up after that many milliseconds and return no keys.
+    """
+    import curses
+
+    if timeout is not None:
+        stdscr.timeout(timeout)
+    try:
+        keys = [stdscr.getkey()]
+    except curses.error:
+        if timeout is None:
+            raise
+        return []
+    finally:
+        if timeout is not None:
+            stdscr.timeout(-1)
+
+    stdscr.nodelay(True)
+    try:
+        while True:
+            keys.append(stdscr.getkey())
+    except curses.error:
+        pass
+    finally:
+        stdscr.nodelay(False)
+    return keys
+
+
+def curses_main(stdscr, *filenames, doupdate=None, profiler=None, budget=None):
+
+    manager = BufferManager(budget)
+    for filename in filenames or [None]:
+        manager.open(filename)
+    entry = manager.switch(filenames[0] if filenames else None)
+
+    lines, cols = stdscr.getmaxyx()
+    # less one line for the header and footer each.
+    viewport = Viewport(top=0, left=0, height=lines - 2, width=cols)
+    renderer = Renderer(stdscr, viewport, doupdate, entry.highlighter, _token_styles())
+    profiler = profiler if profiler is not None else Profiler()
+    search = None
+    prompt = None
+    message = None
+    occurrences = None
+    # keys held back until the file has finished loading.
+    deferred = []
+
+    def apply(edit, record=True):
+        if edit is not None:
+            renderer.damage(edit)
+            if occurrences is not None:
+                occurrences.update(edit)
+            if record and entry.journal is not None:
+                entry.journal.record(entry.buffer, edit)
+
+    def show(new_entry):
+        nonlocal entry, occurrences, message
+        if entry.journal is not None:
+            entry.journal.sync(force=True)
+        entry.scroll = (viewport.top, viewport.left)
+        entry = new_entry
+        viewport.top, viewport.left = entry.scroll
+        occurrences = None
+        renderer.highlighter = entry.highlighter
+        renderer.invalidate()
+        if entry.changed_on_disk:
+            message = f'{entry.path} changed on disk while it was not shown'
+            entry.changed_on_disk = False
+
+    def save(entry):
+        # saving syncs the file to disk, so only then can the journal go.
+        entry.buffer.save(entry.path if entry.path is not None else NEW_FILE_SAVE_PATH)
+        if entry.journal is not None:
+            entry.journal.reset()
 
     while True:
 
-        # draw
-        stdscr.clear()
-        _write_header(stdscr, filename)
-        _write_content(stdscr, buffer)
-        _write_footer(stdscr)
-        stdscr.move(file.line_pos + header_offset, file.char_pos)
-        stdscr.refresh()
-
-        key_value = stdscr.getkey()
-
-        if key_value == 'KEY_LEFT':
-            file.move_left()
-        elif key_value == 'KEY_RIGHT':
-            file.move_right()
-        elif key_value == 'KEY_UP':
-            file.move_up()
-        elif key_value == 'KEY_DOWN':
-            file.move_down()
-        elif key_value == 'q':
-            with open('outfile', 'w') as f:
-                f.write(str(buffer))
-            break
-        else:
-            file.write_char(key_value)
+        buffer, file, loader = entry.buffer, entry.file, entry.loader
+        if loader is not None:
+            apply(file.loaded(loader.drain(buffer)), record=False)
+            if loader.done:
+                loader = entry.loader = None
+
+        with profiler.phase('render'):
+            status = next((mode.status for mode in (search, prompt) if mode is not None), message or 'q to quit')
+            renderer.draw(buffer, file, entry.path, status, loader.progress if loader is not None else None)
+        with profiler.phase('refresh'):
+            renderer.refresh()
+
+        with profiler.phase('input'):
+            if loader is None and deferred:
+                keys, deferred = deferred, []
+            else:
+                timeout = None
+                highlighter = entry.highlighter
+                catching_up = loader is None and highlighter is not None and highlighter.behind
+                if loader is not None:
+                    timeout = LOAD_POLL_INTERVAL
+                elif catching_up:
+                    # only check for keys, and lex towards the lines drawn plain while there are none.
+                    timeout = 0
+                elif entry.journal is not None and entry.journal.pending:
+                    # wake up to sync the last edits to disk if no more keys come before they are due.
+                    timeout = int(Journal.SYNC_INTERVAL * 1000)
+                keys = _read_keys(stdscr, timeout)
+                if not keys and catching_up:
+                    if not highlighter.catch_up():
+                        # draw again the lines that were drawn before their highlighting was known.
+                        renderer.invalidate()
+                    if entry.journal is not None:
+                        entry.journal.sync()
+                elif not keys and entry.journal is not None:
+                    entry.journal.sync(force=True)
+
+            if loader is not None:
+                # while loading, the cursor can move but anything else waits, in order, until the file is complete.
+                moves = 0
+                while not deferred and moves < len(keys) and keys[moves] in MOVEMENT_KEYS:
+                    moves += 1
+                deferred.extend(keys[moves:])
+                keys = keys[:moves]
+
+        with profiler.phase('edit'):
+            # typed text is collected and inserted in one go, so a paste costs one edit and one redraw.
+            text = ''
+            if keys:
+                # a message is shown until the next key.
+                message = None
+            for index, key_value in enumerate(keys):
+                if search is not None:
+                    if not search.handle(key_value):
+                        if search.query:
+                            occurrences = SearchIndex(buffer, search.query)
+                        search = None
+                    continue
+
+                if prompt is not None:
+                    if not prompt.handle(key_value):
+                        if prompt.accepted and prompt.text:
+                            try:
+                                opened = manager.open(prompt.text)
+                            except (OSError, UnicodeDecodeError) as error:
+                                message = f'cannot open {prompt.text}: {getattr(error, "strerror", None) or error}'
+                            else:
+                                show(opened)
+                                deferred[:0] = keys[index + 1:]
+                                prompt = None
+                                break
+                        prompt = None
+                    continue
+
+                if key_value in COMMAND_KEYS and text:
+                    apply(file.write_text(text))
+                    text = ''
+
+                if key_value == 'KEY_LEFT':
+                    file.move_left()
+                elif key_value == 'KEY_RIGHT':
+                    file.move_right()
+                elif key_value == 'KEY_UP':
+                    file.move_up()
+                elif key_value == 'KEY_DOWN':
+                    file.move_down()
+                elif key_value == 'KEY_HOME':
+                    file.move_home()
+                elif key_value == 'KEY_END':
+                    file.move_end()
+                elif key_value in KEYS_BACKSPACE:
+                    apply(file.backspace())
+                elif key_value == KEY_DELETE:
+                    apply(file.delete_char())
+                elif key_value == KEY_UNDO:
+                    apply(file.undo())
+                elif key_value == KEY_REDO:
+                    apply(file.redo())
+                elif key_value == KEY_SEARCH:
+                    search = IncrementalSearch(file)
+                elif key_value == KEY_FIND_NEXT:
+                    if occurrences is not None:
+                        file.find_next(occurrences)
+                elif key_value == KEY_OPEN:
+                    prompt = Prompt('open')
+                elif key_value in (KEY_NEXT_FILE, KEY_CLOSE):
+                    if key_value == KEY_CLOSE:
+                        if buffer.modified:
+                            save(entry)
+                        if len(manager) == 1:
+                            return
+                    try:
+                        show(manager.next() if key_value == KEY_NEXT_FILE else manager.close(entry.path))
+                    except OSError as error:
+                        # the file that could not be read back has been closed, and this one is still shown.
+                        message = f'cannot reopen {error.filename}: {error.strerror or error}'
+                    # the rest of the keys are meant for the file now shown.
+                    deferred[:0] = keys[index + 1:]
+                    break
+                elif key_value == 'q':
+                    # files are only written if they have changes, but a new file is always given one.
+                    for other in manager:
+                        if other.resident and (other.buffer.modified or other is entry and other.path is None):
+                            save(other)
+                        elif other.journal is not None:
+                            other.journal.reset()
+                    return
+                else:
+                    text += key_value
+
+            if text:
+                apply(file.write_text(text))
+            if entry.journal is not None:
+                entry.journal.sync()
 
 
 if __name__ == '__main__':
@@ -1,6 +1,9 @@
+import os
+import re
+
 import pytest
 
-from ted import Buffer, Piece
+from ted import Buffer, ChunkedText, Edit, Piece, SearchIndex, _merge
 
 #########
 # Buffer #
@@ -33,6 +36,10 @@ class TestSimpleContent:
 
         assert buffer._get_indexes(len(content) + 2) == (1, 2)
 
+    def test_piece_has_no_instance_dict(self):
+        piece = Piece(start=0, length=5, source=Buffer.ORIGINAL)
+        assert not hasattr(piece, '__dict__')
+
     def test_split_piece(self):
         content = 'this is test content\n'
         buffer = Buffer(content)
@@ -55,7 +62,19 @@ class TestAddedContent:
         assert buffer._piece_table == [
             Piece(start=0, length=len(content), source=Buffer.ORIGINAL),
             Piece(start=0, length=len(added_content), source=Buffer.ADD),
-            Piece(start=21, length=0, source=Buffer.ORIGINAL),  # TODO: remove pieces with zero length?
+        ]
+
+    def test_typing_in_middle_of_original_extends_one_add_piece(self):
+        content = 'this is test content\n'
+        buffer = Buffer(content)
+
+        for index, char in enumerate('added ', start=8):
+            buffer.insert(char, index)
+
+        assert buffer._piece_table == [
+            Piece(start=0, length=8, source=Buffer.ORIGINAL),
+            Piece(start=0, length=6, source=Buffer.ADD),
+            Piece(start=8, length=len(content) - 8, source=Buffer.ORIGINAL),
         ]
 
     def test_non_empty_with_content_added_at_start(self):
@@ -197,3 +216,471 @@ def test_buffer_with_content_added_at_end_of_added_outputs_expected():
     buffer.insert(added_content_2, insertion_pos_2)
 
     assert str(buffer) == 'this is added content\nmore things\ntest content\n'
+
+
+def test_buffer_with_many_inserts_outputs_expected():
+    content = 'this is test content\n'
+    buffer = Buffer(content)
+    expected = content
+
+    for step in range(500):
+        index = (step * 7919) % (len(expected) + 1)
+        text = str(step % 10)
+        buffer.insert(text, index)
+        expected = expected[:index] + text + expected[index:]
+
+    assert str(buffer) == expected
+    assert len(buffer) == len(expected)
+
+
+##############
+# Line index #
+##############
+
+class TestLineIndex:
+    def test_empty_buffer_has_one_empty_line(self):
+        buffer = Buffer()
+        assert buffer.line_count() == 1
+        assert buffer.get_line(0) == ''
+
+    def test_line_starts_of_original(self):
+        content = 'this is test content\nthat takes up\nthree lines'
+        buffer = Buffer(content)
+        assert buffer.line_count() == 3
+        assert [buffer.line_start(line) for line in range(3)] == [0, 21, 35]
+        assert [buffer.get_line(line) for line in range(3)] == content.splitlines()
+
+    def test_trailing_newline_starts_an_empty_line(self):
+        buffer = Buffer('this is test content\n')
+        assert buffer.line_count() == 2
+        assert buffer.line_start(1) == 21
+        assert buffer.line_length(1) == 0
+
+    def test_lines_follow_inserts(self):
+        content = 'this is test content\n'
+        buffer = Buffer(content)
+        buffer.insert('added\ncontent\n', 8)
+        buffer.insert('more\n', 2)
+
+        expected = str(buffer)
+        assert buffer.line_count() == expected.count('\n') + 1
+        for line, text in enumerate(expected.split('\n')):
+            assert buffer.get_line(line) == text
+            assert buffer.line_length(line) == len(text)
+
+    def test_offset_of(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        assert buffer.offset_of(1, 3) == 24
+
+    def test_get_text_across_pieces(self):
+        buffer = Buffer('this is test content\n')
+        buffer.insert('added content\n', 8)
+        assert buffer.get_text(5, 12) == 'is adde'
+
+
+def test_buffer_output_is_refreshed_after_insert():
+    buffer = Buffer('this is test content\n')
+    assert str(buffer) == 'this is test content\n'
+
+    buffer.insert('added content\n', 8)
+
+    assert str(buffer) == 'this is added content\ntest content\n'
+    assert str(buffer) is str(buffer)
+
+
+def test_buffer_length_follows_inserts():
+    buffer = Buffer('this is test content\n')
+    assert len(buffer) == 21
+
+    buffer.insert('added content\n', 8)
+    buffer.insert('more', 0)
+
+    assert len(buffer) == len(str(buffer)) == 39
+
+
+def test_line_of_offset():
+    buffer = Buffer('this is test content\nthat takes up\nthree lines')
+    buffer.insert('added\n', 8)
+    assert [buffer.line_of(offset) for offset in (0, 13, 14, 26, 27, len(buffer))] == [0, 0, 1, 1, 2, 3]
+
+
+def test_insert_reports_edit():
+    buffer = Buffer('this is test content\nthat takes up two lines')
+
+    edit = buffer.insert('added\ncontent\n', 24)
+
+    assert edit == Edit(start=24, removed=0, inserted=14, line=1, removed_lines=0, inserted_lines=2)
+
+
+###############
+# ChunkedText #
+###############
+
+class TestChunkedText:
+    @pytest.fixture(autouse=True)
+    def small_blocks(self, monkeypatch):
+        monkeypatch.setattr(ChunkedText, 'BLOCK_SIZE', 4)
+
+    def test_appends_match_str(self):
+        text = ChunkedText()
+        expected = ''
+        for value in ('a', 'bc', 'defgh', '', 'ijklmnopqrstu', 'v', 'wxyz'):
+            text.append(value)
+            expected += value
+            assert len(text) == len(expected)
+
+        for start in range(len(expected) + 1):
+            for stop in range(start, len(expected) + 2):
+                assert text[start:stop] == expected[start:stop]
+
+    def test_initial_text(self):
+        text = ChunkedText('this is test content')
+        assert text[:] == 'this is test content'
+
+
+##########
+# Saving #
+##########
+
+def test_iter_chunks_are_bounded(monkeypatch):
+    monkeypatch.setattr(Buffer, 'CHUNK_SIZE', 4)
+    buffer = Buffer('this is test content\n')
+    buffer.insert('added content\n', 8)
+
+    chunks = list(buffer.iter_chunks())
+
+    assert ''.join(chunks) == str(buffer)
+    assert max(len(chunk) for chunk in chunks) == 4
+
+
+def test_write_to(tmp_path):
+    buffer = Buffer('this is test content\n')
+    buffer.insert('added content\n', 8)
+
+    with open(tmp_path / 'out.txt', 'w') as f:
+        buffer.write_to(f)
+
+    assert (tmp_path / 'out.txt').read_text() == 'this is added content\ntest content\n'
+
+
+def test_save_replaces_file(tmp_path):
+    path = tmp_path / 'content.txt'
+    path.write_text('this is test content\n')
+    path.chmod(0o640)
+    buffer = Buffer.from_file(path, use_mmap=True)
+    buffer.insert('added content\n', 8)
+
+    buffer.save(path)
+
+    assert path.read_text() == 'this is added content\ntest content\n'
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ['content.txt']
+
+
+def test_save_new_file_follows_umask(tmp_path):
+    path = tmp_path / 'new.txt'
+    umask = os.umask(0o027)
+    try:
+        Buffer('new content\n').save(path)
+    finally:
+        os.umask(umask)
+
+    assert path.read_text() == 'new content\n'
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_save_writes_through_symlink(tmp_path):
+    target = tmp_path / 'target.txt'
+    target.write_text('this is test content\n')
+    target.chmod(0o640)
+    link = tmp_path / 'link.txt'
+    link.symlink_to(target)
+    buffer = Buffer.from_file(link)
+    buffer.insert('added ', 8)
+
+    buffer.save(link)
+
+    assert link.is_symlink()
+    assert target.read_text() == 'this is added test content\n'
+    assert target.stat().st_mode & 0o777 == 0o640
+
+
+#############
+# Undo/redo #
+#############
+
+class TestUndo:
+    def test_nothing_to_undo(self):
+        buffer = Buffer('this is test content\n')
+        assert buffer.undo() is None
+        assert buffer.redo() is None
+
+    def test_undo_and_redo_insert(self):
+        content = 'this is test content\n'
+        buffer = Buffer(content)
+        buffer.insert('added content\n', 8)
+        buffer.insert('more', 0)
+
+        assert buffer.undo() == Edit(start=0, removed=4, inserted=0, line=0, removed_lines=0, inserted_lines=0)
+        assert str(buffer) == 'this is added content\ntest content\n'
+        buffer.undo()
+        assert str(buffer) == content
+        assert len(buffer) == len(content)
+        assert buffer.line_count() == 2
+
+        assert buffer.redo() == Edit(start=8, removed=0, inserted=14, line=0, removed_lines=0, inserted_lines=1)
+        assert str(buffer) == 'this is added content\ntest content\n'
+        buffer.redo()
+        assert str(buffer) == 'morethis is added content\ntest content\n'
+
+    def test_new_edit_clears_redo(self):
+        buffer = Buffer('this is test content\n')
+        buffer.insert('added', 8)
+        buffer.undo()
+        buffer.insert('other', 0)
+
+        assert buffer.redo() is None
+        assert str(buffer) == 'otherthis is test content\n'
+
+    def test_grouped_inserts_undo_together(self):
+        buffer = Buffer('this is test content\n')
+        for index, char in enumerate('added', start=8):
+            buffer.insert(char, index, group=True)
+        buffer.insert('x', 0, group=True)
+
+        buffer.undo()
+        assert str(buffer) == 'this is addedtest content\n'
+        buffer.undo()
+        assert str(buffer) == 'this is test content\n'
+
+
+def test_compact_joins_contiguous_pieces():
+    content = 'this is test content\n'
+    buffer = Buffer(content)
+    buffer._root = None
+    for piece in [
+        Piece(start=0, length=5, source=Buffer.ORIGINAL),
+        Piece(start=5, length=3, source=Buffer.ORIGINAL),
+        Piece(start=8, length=0, source=Buffer.ORIGINAL),
+        Piece(start=8, length=len(content) - 8, source=Buffer.ORIGINAL),
+    ]:
+        buffer._root = _merge(buffer._root, buffer._new_node(piece))
+    buffer.insert('added', 8)
+
+    buffer.compact()
+
+    assert buffer._piece_table == [
+        Piece(start=0, length=8, source=Buffer.ORIGINAL),
+        Piece(start=0, length=5, source=Buffer.ADD),
+        Piece(start=8, length=len(content) - 8, source=Buffer.ORIGINAL),
+    ]
+    assert str(buffer) == 'this is addedtest content\n'
+    assert buffer.line_count() == 2
+
+
+def test_compact_keeps_buffer_unmodified(tmp_path):
+    buffer = Buffer('this is test content\n')
+    buffer.insert('added', 8)
+    buffer.save(tmp_path / 'out.txt')
+
+    buffer.compact()
+
+    assert not buffer.modified
+
+
+def test_insert_many_uses_original_indexes():
+    buffer = Buffer('this is test content\nthat takes up two lines')
+
+    edits = buffer.insert_many([('!', 44), ('added\n', 8), ('A', 0), ('B', 0), ('', 3)])
+
+    assert str(buffer) == 'ABthis is added\ntest content\nthat takes up two lines!'
+    assert edits == [
+        Edit(start=0, removed=0, inserted=1, line=0, removed_lines=0, inserted_lines=0),
+        Edit(start=1, removed=0, inserted=1, line=0, removed_lines=0, inserted_lines=0),
+        Edit(start=10, removed=0, inserted=6, line=0, removed_lines=0, inserted_lines=1),
+        Edit(start=52, removed=0, inserted=1, line=2, removed_lines=0, inserted_lines=0),
+    ]
+    assert buffer.undo() == Edit(start=0, removed=53, inserted=44, line=0, removed_lines=2, inserted_lines=1)
+    assert str(buffer) == 'this is test content\nthat takes up two lines'
+
+
+def test_insert_many_nothing_to_insert():
+    buffer = Buffer('this is test content\n')
+    assert buffer.insert_many([('', 3)]) == []
+    assert buffer.undo() is None
+
+
+####################
+# Delete / replace #
+####################
+
+class TestDelete:
+    def test_delete_within_original(self):
+        content = 'this is test content\n'
+        buffer = Buffer(content)
+
+        edit = buffer.delete(5, 3)
+
+        assert str(buffer) == 'this test content\n'
+        assert len(buffer) == len(content) - 3
+        assert edit == Edit(start=5, removed=3, inserted=0, line=0, removed_lines=0, inserted_lines=0)
+        assert buffer._piece_table == [
+            Piece(start=0, length=5, source=Buffer.ORIGINAL),
+            Piece(start=8, length=len(content) - 8, source=Buffer.ORIGINAL),
+        ]
+
+    def test_delete_across_pieces(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        buffer.insert('added\n', 8)
+        buffer.insert('more\n', 30)
+
+        edit = buffer.delete(6, 26)
+
+        assert str(buffer) == 'this ire\nt takes up two lines'
+        assert edit.removed_lines == 2
+        assert buffer.line_count() == 2
+        assert [buffer.get_line(line) for line in range(2)] == ['this ire', 't takes up two lines']
+
+    def test_delete_past_end(self):
+        buffer = Buffer('this is test content\n')
+
+        edit = buffer.delete(17, 10)
+
+        assert str(buffer) == 'this is test cont'
+        assert edit.removed == 4
+
+    def test_undo_delete(self):
+        content = 'this is test content\n'
+        buffer = Buffer(content)
+        buffer.delete(5, 3)
+
+        buffer.undo()
+
+        assert str(buffer) == content
+
+
+class TestReplace:
+    def test_replace(self):
+        buffer = Buffer('this is test content\n')
+
+        edit = buffer.replace(8, 4, 'new\nand')
+
+        assert str(buffer) == 'this is new\nand content\n'
+        assert edit == Edit(start=8, removed=4, inserted=7, line=0, removed_lines=0, inserted_lines=1)
+        assert buffer.line_count() == 3
+
+    def test_replace_undoes_as_one(self):
+        content = 'this is test content\n'
+        buffer = Buffer(content)
+        buffer.replace(8, 4, 'new')
+
+        buffer.undo()
+
+        assert str(buffer) == content
+
+
+##########
+# Search #
+##########
+
+class TestFind:
+    @pytest.fixture
+    def buffer(self, monkeypatch):
+        # tiny chunks so matches span chunk and piece boundaries.
+        monkeypatch.setattr(Buffer, 'CHUNK_SIZE', 3)
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        buffer.insert('tested ', 8)
+        return buffer
+
+    def test_literal_matches_across_chunks(self, buffer):
+        text = str(buffer)
+        expected = [index for index in range(len(text)) if text.startswith('test', index)]
+        assert list(buffer.finditer('test')) == expected == [8, 15]
+
+    def test_literal_from_start(self, buffer):
+        assert buffer.find('t', 16) == 18
+        assert buffer.find('missing') is None
+
+    def test_regex_matches_across_chunks(self, buffer):
+        text = str(buffer)
+        expected = [match.start() for match in re.finditer(r't\w+', text)]
+        assert list(buffer.finditer(r't\w+', regex=True)) == expected
+
+    def test_regex_respects_overlap(self, buffer):
+        assert buffer.find(r'content\nthat', regex=True) == 20
+
+    @pytest.mark.parametrize('pattern', [r'^t', r'\At', r'\bt', r'(?<=s )t', r'(?m)^t', r'e\w*$'])
+    def test_regex_sees_text_before_trimmed_window(self, buffer, pattern):
+        text = str(buffer)
+        expected = [match.start() for match in re.finditer(pattern, text)]
+        assert list(buffer.finditer(pattern, regex=True, overlap=2)) == expected
+
+    def test_regex_from_start_sees_text_before_it(self):
+        assert list(Buffer('aaa').finditer('^a', 1, regex=True)) == []
+        assert list(Buffer('a' * 3000).finditer('^a', regex=True)) == [0]
+
+
+class TestSearchIndex:
+    def test_initial_occurrences(self):
+        buffer = Buffer('aaa test tests\n')
+        index = SearchIndex(buffer, 'aa')
+        assert index.offsets == [0, 1]
+
+    def test_initial_scan_works_a_chunk_at_a_time(self, monkeypatch):
+        monkeypatch.setattr(Buffer, 'CHUNK_SIZE', 3)
+        buffer = Buffer('aaaa baaab aa')
+        buffer.insert('aa', 5)
+        monkeypatch.setattr(Buffer, 'get_text', None)
+
+        assert SearchIndex(buffer, 'aa').offsets == [0, 1, 2, 5, 8, 9, 13]
+
+    def test_update_after_edits(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        index = SearchIndex(buffer, 'te')
+
+        for make_edit in (
+            lambda: buffer.insert('tested ', 8),
+            lambda: buffer.delete(0, 3),
+            lambda: buffer.replace(20, 4, 'ontent te'),
+            lambda: buffer.insert('t', 14),
+            buffer.undo,
+        ):
+            index.update(make_edit())
+            assert index.offsets == SearchIndex(buffer, 'te').offsets
+
+    def test_update_across_blocks(self, monkeypatch):
+        monkeypatch.setattr(SearchIndex, 'BLOCK_SIZE', 2)
+        buffer = Buffer('te te te te te te te te\n')
+        index = SearchIndex(buffer, 'te')
+        assert len(index._blocks) == 4
+
+        for make_edit in (
+            lambda: buffer.insert('tetete', 4),
+            lambda: buffer.delete(0, 7),
+            lambda: buffer.insert('x', 30),
+            lambda: buffer.replace(2, 12, 't'),
+            buffer.undo,
+            lambda: buffer.delete(0, len(buffer)),
+            buffer.undo,
+        ):
+            index.update(make_edit())
+            assert index.offsets == SearchIndex(buffer, 'te').offsets
+            assert all(0 < len(block) <= 2 for block in index._blocks)
+        offsets = index.offsets
+        for offset in range(len(buffer) + 1):
+            assert index.next_after(offset) == next((found for found in offsets if found > offset), offsets[0])
+
+    def test_update_after_each_of_many_inserts(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        index = SearchIndex(buffer, 'test')
+
+        for edit in buffer.insert_many([('te', 0), ('st', 0), ('s', 9), ('te', 10), ('t', 30)]):
+            index.update(edit)
+
+        assert index.offsets == SearchIndex(buffer, 'test').offsets == [0, 15]
+
+    def test_next_after_wraps(self):
+        buffer = Buffer('test this test')
+        index = SearchIndex(buffer, 'test')
+        assert index.next_after(0) == 10
+        assert index.next_after(10) == 0
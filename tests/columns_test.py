@@ -0,0 +1,181 @@
+import sys
+
+import pytest
+
+from ted import Buffer, ColumnCache, File, FilePosition, LineColumns, Renderer, Viewport, _char_width, _wcwidth
+
+
+class TestCharWidth:
+    @pytest.fixture(params=['wcwidth', 'unicodedata'])
+    def char_width(self, request, monkeypatch):
+        if request.param == 'wcwidth':
+            pytest.importorskip('wcwidth')
+        else:
+            monkeypatch.setitem(sys.modules, 'wcwidth', None)
+        _wcwidth.cache_clear()
+        _char_width.cache_clear()
+        yield _char_width
+        _wcwidth.cache_clear()
+        _char_width.cache_clear()
+
+    def test_widths(self, char_width):
+        assert [char_width(char) for char in ('a', '中', '́', '‍', '\x01')] == [1, 2, 0, 0, 2]
+
+
+class TestLineColumns:
+    def test_ascii_maps_to_itself(self):
+        columns = LineColumns('plain text')
+
+        assert columns.column(5) == 5
+        assert columns.index(5) == 5
+        assert columns.index(50) == 10
+        assert columns.width == 10
+
+    def test_tab_stops(self):
+        columns = LineColumns('a\tb\t\tc')
+
+        assert [columns.column(index) for index in range(7)] == [0, 1, 8, 9, 16, 24, 25]
+        assert columns.index(4) == 1
+        assert columns.render('a\tb') == 'a       b'
+        assert columns.render('b\t\tc', 2) == 'b' + ' ' * 15 + 'c'
+
+    def test_wide_characters(self):
+        columns = LineColumns('a中文b')
+
+        assert [columns.column(index) for index in range(5)] == [0, 1, 3, 5, 6]
+        assert columns.index(2) == 1
+        assert columns.index(3) == 2
+
+    def test_combining_marks_and_joiners_join_grapheme(self):
+        # e with an acute accent, then a family emoji of three people joined by zero-width joiners.
+        text = 'éx\U0001F468‍\U0001F469‍\U0001F467y'
+        columns = LineColumns(text)
+
+        assert columns.next(0) == 2
+        assert columns.next(3) == 8
+        assert columns.previous(8) == 3
+        assert columns.previous(2) == 0
+        assert columns.index(columns.column(5)) == 3
+
+    def test_undecodable_bytes_render_as_replacement_character(self):
+        assert LineColumns('a\udce9b').render('a\udce9b') == 'a\ufffdb'
+
+    def test_window_leaves_out_partly_visible_wide_characters(self):
+        columns = LineColumns('中文字')
+
+        assert columns.window(1, 4) == (1, 2, 1)
+        assert columns.window(0, 3) == (0, 1, 0)
+
+
+class TestColumnCache:
+    def test_keeps_lines_not_edited(self):
+        buffer = Buffer('a\tb\n中\nc\t')
+        cache = ColumnCache(buffer)
+        first, last = cache[0], cache[2]
+
+        edit = buffer.insert('x\ny', buffer.offset_of(1, 0))
+        cache.update(edit)
+
+        assert cache[0] is first
+        assert cache[3] is last
+        assert cache[2].column(2) == 3
+
+
+class TestFileMovement:
+    def test_moves_over_graphemes(self):
+        file = File(Buffer('é́x'), FilePosition.origin())
+
+        file.move_right()
+        assert file.char_pos == 3
+
+        file.move_left()
+        assert file.char_pos == 0
+
+    def test_vertical_movement_keeps_screen_column(self):
+        file = File(Buffer('\tend\n中文字\nabcdefghij'), FilePosition(x=1, y=0))
+
+        file.move_down()
+        assert (file.char_pos, file.column) == (3, 6)
+
+        file.move_down()
+        assert (file.char_pos, file.column) == (6, 6)
+
+    def test_edit_refreshes_columns(self):
+        file = File(Buffer('abc'), FilePosition.origin())
+        assert file.column == 0
+
+        file.write_char('\t')
+
+        assert (file.char_pos, file.column) == (1, 8)
+
+    def test_delete_takes_whole_grapheme(self):
+        buffer = Buffer('éx')
+        file = File(buffer, FilePosition.origin())
+
+        file.delete_char()
+
+        assert str(buffer) == 'x'
+
+
+class CursorScreen:
+    def __init__(self):
+        self.text = []
+        self.cursor = None
+
+    def move(self, row, col):
+        self.cursor = (row, col)
+
+    def addstr(self, *args):
+        if isinstance(args[0], str):
+            self.text.append(args[0])
+
+    def clrtoeol(self):
+        pass
+
+    def insstr(self, *args):
+        pass
+
+
+class TestRendering:
+    def test_cursor_and_text_at_screen_columns(self):
+        screen = CursorScreen()
+        file = File(Buffer('\t中x'), FilePosition(x=2, y=0))
+        renderer = Renderer(screen, Viewport(top=0, left=0, height=3, width=20), doupdate=lambda: None)
+
+        renderer.draw(file._buffer, file)
+
+        assert screen.cursor == (1, 10)
+        assert '        中x' in screen.text
+
+
+class TestLongLines:
+    @pytest.fixture
+    def buffer(self):
+        return Buffer('short\n' + 'x\t' * 100_000 + '\nshort')
+
+    def test_long_line_is_one_column_per_character(self, buffer):
+        columns = ColumnCache(buffer)[1]
+
+        assert columns.column(150_000) == 150_000
+        assert columns.next(7) == 8
+
+    def test_get_line_slice(self, buffer):
+        assert buffer.get_line(1, 10, 14) == 'x\tx\t'
+        assert buffer.get_line(2, 3, 50) == 'rt'
+
+    def test_renders_only_visible_window(self, buffer, monkeypatch):
+        read = []
+        get_text = Buffer.get_text
+        monkeypatch.setattr(Buffer, 'get_text', lambda self, start, stop: read.append(stop - start) or get_text(
+            self, start, stop,
+        ))
+        screen = CursorScreen()
+        file = File(buffer, FilePosition(x=0, y=1))
+        renderer = Renderer(screen, Viewport(top=0, left=0, height=3, width=20), doupdate=lambda: None)
+
+        file.move_end()
+        renderer.draw(buffer, file)
+
+        assert screen.cursor == (2, 19)
+        assert ' x' * 9 + ' ' in screen.text
+        assert max(read) <= 20
@@ -184,3 +184,98 @@ class TestBufferIntegration:
 
         assert str(file._buffer) == '\nthis is test content'
         assert file._position == FilePosition(x=0, y=1)
+
+    def test_write_text_multi_line(self):
+        content = 'this is test content\nthat takes up two lines'
+        buffer = Buffer(content)
+
+        file = File(buffer, FilePosition(x=3, y=1))
+
+        file.write_text('pasted\ntext ')
+
+        assert str(buffer) == 'this is test content\nthapasted\ntext t takes up two lines'
+        assert file._position == FilePosition(x=5, y=2)
+
+    def test_backspace_joins_lines(self):
+        content = 'this is test content\nthat takes up two lines'
+        buffer = Buffer(content)
+
+        file = File(buffer, FilePosition(x=0, y=1))
+
+        file.backspace()
+
+        assert str(buffer) == 'this is test contentthat takes up two lines'
+        assert file._position == FilePosition(x=20, y=0)
+
+    def test_backspace_at_start(self):
+        buffer = Buffer('this is test content')
+
+        file = File(buffer, FilePosition.origin())
+
+        assert file.backspace() is None
+        assert str(buffer) == 'this is test content'
+
+    def test_delete_char(self):
+        buffer = Buffer('this is test content')
+
+        file = File(buffer, FilePosition(x=3, y=0))
+
+        file.delete_char()
+
+        assert str(buffer) == 'thi is test content'
+        assert file._position == FilePosition(x=3, y=0)
+
+    def test_delete_char_at_end(self):
+        buffer = Buffer('this is test content')
+
+        file = File(buffer, FilePosition(x=20, y=0))
+
+        assert file.delete_char() is None
+
+
+class TestUndo:
+    def test_undo_typing(self):
+        content = 'this is test content\nthat takes up two lines'
+        buffer = Buffer(content)
+        file = File(buffer, FilePosition(x=3, y=1))
+
+        for char in 'abc\nd':
+            file.write_char(char)
+        file.undo()
+
+        assert str(buffer) == content
+        assert file._position == FilePosition(x=3, y=1)
+
+    def test_redo_typing(self):
+        content = 'this is test content\nthat takes up two lines'
+        buffer = Buffer(content)
+        file = File(buffer, FilePosition(x=3, y=1))
+
+        for char in 'abc\nd':
+            file.write_char(char)
+        file.undo()
+        file.redo()
+
+        assert str(buffer) == 'this is test content\nthaabc\ndt takes up two lines'
+        assert file._position == FilePosition(x=1, y=2)
+
+
+class TestFind:
+    def test_find_moves_to_match(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        file = File(buffer, FilePosition(x=3, y=0))
+
+        assert file.find('t') == FilePosition(x=8, y=0)
+
+    def test_find_wraps_around(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        file = File(buffer, FilePosition(x=3, y=1))
+
+        assert file.find('is') == FilePosition(x=2, y=0)
+
+    def test_find_no_match_stays_put(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        file = File(buffer, FilePosition(x=3, y=1))
+
+        assert file.find('missing') is None
+        assert file._position == FilePosition(x=3, y=1)
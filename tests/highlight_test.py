@@ -0,0 +1,145 @@
+import random
+
+import pytest
+
+from ted import KEY_ENTER, KEY_SEARCH, Buffer, HeadlessScreen, Highlighter, PythonLexer, curses_main
+
+
+def relexed_states(buffer):
+    lexer = PythonLexer()
+    states = [None]
+    for line in range(buffer.line_count() - 1):
+        states.append(lexer.lex(buffer.get_line(line), states[-1])[1])
+    return states
+
+
+class TestPythonLexer:
+    def test_tokens(self):
+        tokens, state = PythonLexer().lex('def f(x): return "a # b" # note 12')
+
+        assert tokens == [(0, 3, 'keyword'), (10, 16, 'keyword'), (17, 24, 'string'), (25, 34, 'comment')]
+        assert state is None
+
+    def test_triple_quoted_string_spans_lines(self):
+        lexer = PythonLexer()
+
+        tokens, state = lexer.lex('x = """start')
+        assert tokens == [(4, 12, 'string')]
+        assert state == '"""'
+
+        tokens, state = lexer.lex('end""" if 1.5', state)
+        assert tokens == [(0, 6, 'string'), (7, 9, 'keyword'), (10, 13, 'number')]
+        assert state is None
+
+
+class TestHighlighter:
+    def test_lexes_only_as_far_as_drawn(self):
+        buffer = Buffer('pass\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+
+        assert highlighter.tokens(9) == [(0, 4, 'keyword')]
+        assert len(highlighter._states) == 10
+
+    def test_edit_relexes_until_state_converges(self):
+        buffer = Buffer('a = 1\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+        highlighter.tokens(99)
+
+        assert highlighter.update(buffer.insert('b = """x\n"""\n', buffer.offset_of(1, 0))) == 4
+        assert highlighter.tokens(2) == [(0, 3, 'string')]
+        assert highlighter.tokens(3) == [(4, 5, 'number')]
+
+    def test_unterminated_string_relexes_to_the_end(self):
+        buffer = Buffer('a = 1\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+        highlighter.tokens(99)
+
+        assert highlighter.update(buffer.insert('"""', 0)) == buffer.line_count()
+        assert highlighter.tokens(99) == [(0, 5, 'string')]
+
+    def test_edit_splices_states_in_place(self):
+        buffer = Buffer('a = 1\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+        highlighter.tokens(99)
+        states = highlighter._states
+
+        highlighter.update(buffer.insert('"""\n\n"""\n', buffer.offset_of(10, 0)))
+
+        assert highlighter._states is states
+        assert states == relexed_states(buffer)[:len(states)]
+        assert len(states) == 103
+
+    def test_lines_far_below_are_lexed_between_keys(self, monkeypatch):
+        monkeypatch.setattr(Highlighter, 'LEX_STEP', 10)
+        buffer = Buffer('"""\n' + 'a = 1\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+
+        assert highlighter.tokens(95) == []
+        assert highlighter.behind
+
+        steps = 1
+        while highlighter.catch_up():
+            steps += 1
+        assert steps == 10
+        assert highlighter.tokens(95) == [(0, 5, 'string')]
+
+    def test_editor_highlights_lines_drawn_plain_once_lexed(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(Highlighter, 'LEX_STEP', 5)
+        path = tmp_path / 'module.py'
+        path.write_text('"""\n' + 'a = 1\n' * 100 + 'zz\n')
+        drawn = {}
+        tokens = Highlighter.tokens
+        monkeypatch.setattr(Highlighter, 'tokens', lambda self, line: drawn.setdefault(line, []).append(
+            tokens(self, line)) or drawn[line][-1])
+        # searching jumps far below the lines lexed for the first frame.
+        screen = HeadlessScreen([KEY_SEARCH, 'z', 'z', KEY_ENTER])
+
+        with pytest.raises(EOFError):
+            curses_main(screen, str(path), doupdate=screen.doupdate)
+
+        assert drawn[90][0] == []
+        assert drawn[90][-1] == [(0, 5, 'string')]
+
+    def test_edit_beyond_lexed_lines_costs_nothing(self):
+        buffer = Buffer('a = 1\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+        highlighter.tokens(5)
+
+        assert highlighter.update(buffer.insert('"""', buffer.offset_of(50, 0))) == 50
+
+    def test_gives_up_after_relex_limit(self, monkeypatch):
+        monkeypatch.setattr(Highlighter, 'RELEX_LIMIT', 10)
+        buffer = Buffer('a = 1\n' * 100)
+        highlighter = Highlighter(buffer, PythonLexer())
+        highlighter.tokens(99)
+
+        assert highlighter.update(buffer.insert('"""', 0)) == buffer.line_count()
+        assert highlighter.tokens(99) == [(0, 5, 'string')]
+
+    def test_matches_full_relex_after_random_edits(self):
+        rng = random.Random(4)
+        buffer = Buffer('x = 1\n"""doc\nstring"""\n# comment\n' * 10)
+        highlighter = Highlighter(buffer, PythonLexer())
+        snippets = ['"""', '\n', 'a', '# ', "'''\n", 'if 2\n']
+
+        for _ in range(200):
+            highlighter.tokens(rng.randrange(buffer.line_count()))
+            if len(buffer) and rng.random() < 0.3:
+                start = rng.randrange(len(buffer))
+                edit = buffer.delete(start, min(rng.randint(1, 8), len(buffer) - start))
+            elif rng.random() < 0.1:
+                edit = buffer.undo() or buffer.insert('a', 0)
+            else:
+                edit = buffer.insert(rng.choice(snippets), rng.randint(0, len(buffer)))
+            highlighter.update(edit)
+
+            expected = relexed_states(buffer)
+            assert highlighter._states == expected[:len(highlighter._states)]
+
+    def test_long_lines_are_not_lexed(self, monkeypatch):
+        monkeypatch.setattr('ted.LONG_LINE', 10)
+        buffer = Buffer('a = """\n' + 'x = 1 ' * 10 + '\n"""')
+        highlighter = Highlighter(buffer, PythonLexer())
+
+        assert highlighter.tokens(1) == []
+        assert highlighter.tokens(2) == [(0, 3, 'string')]
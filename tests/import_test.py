@@ -0,0 +1,19 @@
+import subprocess
+import sys
+from pathlib import Path
+
+
+def test_import_has_no_side_effects(tmp_path):
+    # import in a fresh interpreter, from an empty directory, to see exactly what importing ted pulls in.
+    code = (
+        'import sys, ted; '
+        "print(sorted(m for m in ('curses', '_curses', 'argparse', 'json', 'shutil', 'tempfile', 'logging', 'wcwidth') "
+        'if m in sys.modules))'
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=tmp_path, capture_output=True, text=True, check=True,
+        env={'PYTHONPATH': str(Path(__file__).parent.parent)},
+    )
+
+    assert result.stdout.strip() == '[]'
+    assert list(tmp_path.iterdir()) == []
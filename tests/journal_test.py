@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from ted import Buffer, BufferManager, HeadlessScreen, Journal, curses_main
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'content.txt'
+    path.write_text('first line\nsecond line\n')
+    return str(path)
+
+
+def journal_edits(buffer, journal, *edits):
+    for edit in edits:
+        made = edit(buffer)
+        for made in made if isinstance(made, list) else [made]:
+            journal.record(buffer, made)
+    journal.sync(force=True)
+
+
+class TestJournal:
+    def test_recovers_edits(self, path):
+        buffer = Buffer.from_file(path)
+        journal = Journal(path)
+        journal_edits(
+            buffer, journal,
+            lambda buffer: buffer.insert('new ', 0),
+            lambda buffer: buffer.delete(4, 6),
+            lambda buffer: buffer.undo(),
+            lambda buffer: buffer.insert_many([('a', 0), ('b', 15)]),
+        )
+
+        recovered = Buffer.from_file(path)
+
+        assert Journal(path).recover(recovered) == 5
+        assert str(recovered) == str(buffer)
+        assert recovered.modified
+
+    def test_ignores_journal_for_another_version(self, path):
+        buffer = Buffer.from_file(path)
+        journal = Journal(path)
+        journal_edits(buffer, journal, lambda buffer: buffer.insert('new ', 0))
+        with open(path, 'a') as f:
+            f.write('third line\n')
+
+        assert Journal(path).recover(Buffer.from_file(path)) == 0
+        assert not os.path.exists(journal.journal_path)
+
+    def test_drops_edit_cut_short(self, path):
+        buffer = Buffer.from_file(path)
+        journal = Journal(path)
+        journal_edits(buffer, journal, lambda buffer: buffer.insert('new ', 0))
+        with open(journal.journal_path, 'a') as f:
+            f.write('[4, 0, "par')
+
+        recovered = Buffer.from_file(path)
+        journal = Journal(path)
+        assert journal.recover(recovered) == 1
+        journal_edits(recovered, journal, lambda buffer: buffer.insert('more ', 0))
+
+        assert Journal(path).recover(Buffer.from_file(path)) == 2
+
+    def test_syncs_in_batches(self, path):
+        buffer = Buffer.from_file(path)
+        journal = Journal(path)
+
+        journal.record(buffer, buffer.insert('a', 0))
+        journal.sync()
+        assert journal.pending
+
+        journal.sync(force=True)
+        assert not journal.pending
+
+    def test_reset_after_save(self, path):
+        buffer = Buffer.from_file(path)
+        journal = Journal(path)
+        journal_edits(buffer, journal, lambda buffer: buffer.insert('new ', 0))
+
+        buffer.save(path)
+        journal.reset()
+
+        assert not os.path.exists(journal.journal_path)
+        assert Journal(path).recover(Buffer.from_file(path)) == 0
+
+
+class TestRecovery:
+    def test_reopening_after_crash_recovers_edits(self, path):
+        screen = HeadlessScreen(['a', 'b', 'KEY_DOWN', 'c'])
+        with pytest.raises(EOFError):
+            curses_main(screen, path, doupdate=screen.doupdate)
+
+        screen = HeadlessScreen(['q'])
+        curses_main(screen, path, doupdate=screen.doupdate)
+
+        assert open(path).read() == 'abfirst line\nseccond line\n'
+        assert not os.path.exists(Journal(path).journal_path)
+
+    def test_closing_unmodified_file_removes_journal(self, path):
+        manager = BufferManager()
+        entry = manager.open(path)
+        entry.journal.record(entry.buffer, entry.buffer.insert('a', 0))
+        entry.journal.record(entry.buffer, entry.buffer.undo())
+
+        manager.close(path)
+
+        assert not os.path.exists(entry.journal.journal_path)
+
+    def test_save_is_on_disk_before_journal_is_removed(self, path, monkeypatch):
+        events = []
+        fsync, unlink = os.fsync, os.unlink
+        monkeypatch.setattr(os, 'fsync', lambda fd: events.append('fsync') or fsync(fd))
+        monkeypatch.setattr(os, 'unlink', lambda name: events.append(os.path.basename(name)) or unlink(name))
+        screen = HeadlessScreen(['a', 'q'])
+
+        curses_main(screen, path, doupdate=screen.doupdate)
+
+        # the new contents, then the directory, then away goes the journal.
+        assert events[-3:] == ['fsync', 'fsync', '.content.txt.journal']
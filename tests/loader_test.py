@@ -0,0 +1,109 @@
+import pytest
+
+import ted
+from ted import Buffer, FileLoader, HeadlessScreen, MappedLoader, MappedText, curses_main
+
+CONTENT = 'this is test content\r\nwith ünïcödé characters\n\nthat takes up\nfive lines'
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'content.txt'
+    path.write_bytes(CONTENT.encode('utf-8'))
+    return path
+
+
+def load(loader, buffer):
+    while not loader.done:
+        loader.drain(buffer, wait=True)
+
+
+class TestBufferLoad:
+    def test_load_appends_original(self):
+        buffer = Buffer()
+
+        edit = buffer.load('this is test\n')
+        buffer.load('content\n')
+
+        assert str(buffer) == 'this is test\ncontent\n'
+        assert buffer.line_count() == 3
+        assert edit.inserted_lines == 1
+        assert buffer.undo() is None
+
+
+class TestFileLoader:
+    def test_loads_whole_file(self, path):
+        buffer = Buffer()
+        # a tiny chunk size so multi-byte characters and line endings are split across chunks.
+        loader = FileLoader(path, chunk_size=3)
+
+        load(loader, buffer)
+
+        assert str(buffer) == CONTENT
+        assert loader.progress == 100
+
+    def test_read_error_raises_on_drain(self, tmp_path):
+        loader = FileLoader(tmp_path)
+
+        with pytest.raises(IsADirectoryError):
+            load(loader, Buffer())
+
+
+class TestMappedLoader:
+    def test_loads_whole_file(self, path):
+        text = MappedText(path, chunk_size=3, lazy=True)
+        buffer = Buffer(text)
+        loader = MappedLoader(text)
+
+        load(loader, buffer)
+
+        assert str(buffer) == CONTENT
+        assert buffer.line_count() == CONTENT.count('\n') + 1
+        assert not buffer.modified
+        assert loader.progress == 100
+        text.close()
+
+
+class TestBackgroundLoading:
+    def test_edits_wait_for_loading(self, path, monkeypatch):
+        monkeypatch.setattr(ted, 'BACKGROUND_LOAD_THRESHOLD', 0)
+        monkeypatch.setattr(FileLoader, 'CHUNK_SIZE', 3)
+        screen = HeadlessScreen(['KEY_DOWN', 'a', 'KEY_DOWN', 'b', 'q'])
+
+        curses_main(screen, str(path), doupdate=screen.doupdate)
+
+        assert path.read_text() == 'this is test content\nawith ünïcödé characters\nb\nthat takes up\nfive lines'
+
+    def test_edits_wait_for_mapped_file(self, path, monkeypatch):
+        monkeypatch.setattr(ted, 'BACKGROUND_LOAD_THRESHOLD', 0)
+        monkeypatch.setattr(Buffer, 'MMAP_THRESHOLD', 0)
+        monkeypatch.setattr(MappedText, 'CHUNK_SIZE', 3)
+        screen = HeadlessScreen(['KEY_DOWN', 'a', 'KEY_DOWN', 'b', 'q'])
+
+        curses_main(screen, str(path), doupdate=screen.doupdate)
+
+        assert path.read_bytes() == CONTENT.replace('\nwith', '\nawith').replace('\n\n', '\nb\n').encode('utf-8')
+
+
+class TestDecoding:
+    DATA = b'ab\r\ncd\r\n\xe9\n\xf0\x9f\x98\x80'
+
+    @pytest.fixture
+    def path(self, tmp_path):
+        path = tmp_path / 'mixed.txt'
+        path.write_bytes(self.DATA)
+        return path
+
+    def test_every_load_path_gives_the_same_text(self, path):
+        loaded = Buffer()
+        load(FileLoader(path, chunk_size=3), loaded)
+
+        texts = {str(Buffer.from_file(path, use_mmap=False)), str(Buffer.from_file(path, use_mmap=True)), str(loaded)}
+
+        assert texts == {'ab\r\ncd\r\n\udce9\n\U0001F600'}
+
+    def test_save_gives_back_the_same_bytes(self, path, tmp_path):
+        for use_mmap in (False, True):
+            Buffer.from_file(path, use_mmap=use_mmap).save(tmp_path / 'saved.txt')
+
+            assert (tmp_path / 'saved.txt').read_bytes() == self.DATA
@@ -0,0 +1,220 @@
+import os
+
+import pytest
+
+from ted import KEY_CLOSE, KEY_ENTER, KEY_NEXT_FILE, KEY_OPEN, Buffer, BufferManager, HeadlessScreen, curses_main
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for name in ('first', 'second', 'third'):
+        path = tmp_path / f'{name}.txt'
+        path.write_text(f'{name} file\nsecond line\n')
+        paths.append(str(path))
+    return paths
+
+
+class TestModified:
+    def test_tracks_edits_undo_and_save(self, tmp_path):
+        buffer = Buffer('text')
+        assert not buffer.modified
+
+        buffer.insert('more ', 0)
+        assert buffer.modified
+
+        buffer.undo()
+        assert not buffer.modified
+
+        buffer.redo()
+        buffer.save(tmp_path / 'out.txt')
+        assert not buffer.modified
+
+    def test_loading_is_not_a_modification(self):
+        buffer = Buffer()
+        buffer.load('loaded text')
+        assert not buffer.modified
+
+
+class TestBufferManager:
+    def test_open_switch_and_close(self, paths):
+        manager = BufferManager()
+        for path in paths:
+            manager.open(path)
+        assert manager.current.path == paths[2]
+
+        assert manager.switch(paths[0]).path == paths[0]
+        assert manager.open(paths[0]) is manager.current
+        assert len(manager) == 3
+
+        assert manager.close(paths[0]).path == paths[2]
+        assert [entry.path for entry in manager] == [paths[1], paths[2]]
+
+    def test_next_cycles_through_files(self, paths):
+        manager = BufferManager()
+        for path in paths:
+            manager.open(path)
+        manager.switch(paths[0])
+
+        assert [manager.next().path for _ in range(4)] == [paths[1], paths[2], paths[0], paths[1]]
+
+    def test_missing_path_opens_empty_buffer(self, tmp_path):
+        entry = BufferManager().open(str(tmp_path / 'new.txt'))
+        assert str(entry.buffer) == ''
+
+    def test_evicts_least_recently_used_within_budget(self, paths):
+        manager = BufferManager(budget=0)
+        for path in paths:
+            manager.open(path)
+
+        assert [entry.resident for entry in manager] == [False, False, True]
+
+    def test_keeps_modified_files_resident(self, paths):
+        manager = BufferManager(budget=0)
+        manager.open(paths[0]).file.write_text('edited ')
+        manager.open(paths[1])
+
+        assert [entry.resident for entry in manager] == [True, True]
+
+    def test_restores_evicted_file_with_cursor(self, paths):
+        manager = BufferManager(budget=0)
+        entry = manager.open(paths[0])
+        entry.file.move_down()
+        entry.file.move_right()
+        manager.open(paths[1])
+        assert not entry.resident
+
+        restored = manager.switch(paths[0])
+
+        assert str(restored.buffer) == 'first file\nsecond line\n'
+        assert (restored.file.line_pos, restored.file.char_pos) == (1, 1)
+        assert [entry.resident for entry in manager] == [False, True]
+
+    def test_keeps_files_not_yet_on_disk_resident(self, paths, tmp_path):
+        manager = BufferManager(budget=0)
+        new = str(tmp_path / 'new.txt')
+        manager.open(new)
+        manager.open(paths[0])
+
+        assert str(manager.switch(new).buffer) == ''
+
+    def test_restores_file_as_it_was_read(self, tmp_path, paths):
+        path = tmp_path / 'crlf.txt'
+        path.write_bytes(b'ab\r\ncd\r\n')
+        manager = BufferManager(budget=0)
+        text = str(manager.open(str(path)).buffer)
+        manager.open(paths[0])
+
+        assert str(manager.switch(str(path)).buffer) == text
+
+    def test_deleted_evicted_file_is_closed_on_switch(self, paths):
+        manager = BufferManager(budget=0)
+        manager.open(paths[0])
+        manager.open(paths[1])
+        os.unlink(paths[0])
+
+        with pytest.raises(FileNotFoundError):
+            manager.next()
+
+        assert manager.current.path == paths[1]
+        assert [entry.path for entry in manager] == [paths[1]]
+
+    def test_deleted_evicted_file_is_closed_on_close(self, paths):
+        manager = BufferManager(budget=0)
+        for path in paths:
+            manager.open(path)
+        os.unlink(paths[1])
+
+        with pytest.raises(FileNotFoundError):
+            manager.close(paths[2])
+        assert manager.current.path == paths[2]
+
+        assert manager.close(paths[2]).path == paths[0]
+        assert [entry.path for entry in manager] == [paths[0]]
+
+    def test_notes_file_changed_while_evicted(self, paths):
+        manager = BufferManager(budget=0)
+        entry = manager.open(paths[0])
+        manager.open(paths[1])
+        with open(paths[0], 'a') as f:
+            f.write('third line\n')
+
+        assert manager.switch(paths[0]).changed_on_disk
+        assert str(entry.buffer) == 'first file\nsecond line\nthird line\n'
+        assert not manager.switch(paths[1]).changed_on_disk
+
+
+class TestMultipleFiles:
+    def test_edit_switch_and_save_all(self, paths):
+        screen = HeadlessScreen(['a', KEY_NEXT_FILE, 'b', 'q'])
+
+        curses_main(screen, paths[0], paths[1], doupdate=screen.doupdate)
+
+        assert open(paths[0]).read() == 'afirst file\nsecond line\n'
+        assert open(paths[1]).read() == 'bsecond file\nsecond line\n'
+
+    def test_open_and_close(self, paths):
+        keys = [KEY_OPEN, *paths[1], KEY_ENTER, 'b', KEY_CLOSE, 'a', 'q']
+        screen = HeadlessScreen(keys)
+
+        curses_main(screen, paths[0], doupdate=screen.doupdate)
+
+        assert open(paths[0]).read() == 'afirst file\nsecond line\n'
+        assert open(paths[1]).read() == 'bsecond file\nsecond line\n'
+
+    def test_quitting_leaves_unedited_files_alone(self, paths):
+        with open(paths[0], 'wb') as f:
+            f.write(b'first\r\nfile\n')
+        screen = HeadlessScreen(['KEY_DOWN', 'q'])
+
+        curses_main(screen, paths[0], doupdate=screen.doupdate)
+
+        with open(paths[0], 'rb') as f:
+            assert f.read() == b'first\r\nfile\n'
+
+    def test_failing_to_open_shows_error(self, paths, tmp_path):
+        screen = HeadlessScreen([KEY_OPEN, *str(tmp_path), KEY_ENTER])
+        footers = []
+        screen.insstr = lambda row, col, text, *args: footers.append(text.strip())
+
+        with pytest.raises(EOFError):
+            curses_main(screen, paths[0], doupdate=screen.doupdate)
+
+        assert footers[-1] == f'cannot open {tmp_path}: Is a directory'
+
+    def test_switching_to_changed_file_shows_warning(self, paths):
+        screen = HeadlessScreen([KEY_NEXT_FILE])
+        footers = []
+        screen.insstr = lambda row, col, text, *args: footers.append(text.strip())
+        getkey = screen.getkey
+
+        def change_then_getkey():
+            with open(paths[1], 'a') as f:
+                f.write('third line\n')
+            return getkey()
+
+        screen.getkey = change_then_getkey
+
+        with pytest.raises(EOFError):
+            curses_main(screen, paths[0], paths[1], doupdate=screen.doupdate, budget=0)
+
+        assert footers[-1] == f'{paths[1]} changed on disk while it was not shown'
+
+    def test_switching_to_deleted_file_shows_error(self, paths):
+        screen = HeadlessScreen([KEY_NEXT_FILE])
+        footers = []
+        screen.insstr = lambda row, col, text, *args: footers.append(text.strip())
+        getkey = screen.getkey
+
+        def delete_then_getkey():
+            # the second file has been evicted by now.
+            if os.path.exists(paths[1]):
+                os.unlink(paths[1])
+            return getkey()
+
+        screen.getkey = delete_then_getkey
+
+        with pytest.raises(EOFError):
+            curses_main(screen, paths[0], paths[1], doupdate=screen.doupdate, budget=0)
+
+        assert footers[-1] == f'cannot reopen {paths[1]}: No such file or directory'
@@ -0,0 +1,86 @@
+import pytest
+
+from ted import Buffer, MappedText
+
+CONTENT = 'this is test content\nwith ünïcödé characters\n\nand a 中文 line\nthat ends here'
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'content.txt'
+    path.write_bytes(CONTENT.encode('utf-8'))
+    return path
+
+
+@pytest.fixture
+def text(path):
+    # a tiny chunk size so every test crosses chunk boundaries.
+    text = MappedText(path, chunk_size=7)
+    yield text
+    text.close()
+
+
+class TestMappedText:
+    def test_length_counts_characters(self, text):
+        assert len(text) == len(CONTENT)
+
+    def test_slices_match_decoded_content(self, text):
+        for start in range(0, len(CONTENT), 5):
+            for stop in range(start, len(CONTENT) + 1, 3):
+                assert text[start:stop] == CONTENT[start:stop]
+
+    def test_newline_queries(self, text):
+        positions = [index for index, char in enumerate(CONTENT) if char == '\n']
+        assert [text.newline(index) for index in range(len(positions))] == positions
+        for position in range(len(CONTENT) + 1):
+            assert text.newlines_before(position) == CONTENT[:position].count('\n')
+
+    def test_lazy_text_grows_as_chunks_are_recorded(self, path):
+        text = MappedText(path, chunk_size=7, lazy=True)
+        assert len(text) == 0
+        assert not text.done
+
+        chunks = text.scan()
+        text.extend([next(chunks), next(chunks)])
+        assert text[0:len(text)] == CONTENT[:14]
+        assert text.newlines_before(len(text)) == 0
+
+        text.extend(chunks)
+        assert text.done
+        assert text[0:len(text)] == CONTENT
+        assert text.newlines_before(len(text)) == CONTENT.count('\n')
+        text.close()
+
+    @pytest.mark.parametrize('chunk_size', [1, 2, 3, 16])
+    def test_tiny_chunks_and_stray_continuation_bytes(self, tmp_path, chunk_size):
+        path = tmp_path / 'stray.txt'
+        data = b'\x80' * 64 + 'ü中\U0001F600'.encode('utf-8')
+        path.write_bytes(data)
+
+        text = MappedText(path, chunk_size=chunk_size)
+
+        assert text[0:len(text)].encode('utf-8', 'surrogateescape') == data
+        text.close()
+
+
+class TestMappedBuffer:
+    def test_from_file_maps_when_asked(self, path):
+        buffer = Buffer.from_file(path, use_mmap=True)
+
+        assert isinstance(buffer._original, MappedText)
+        assert str(buffer) == CONTENT
+
+    def test_from_file_reads_small_files(self, path):
+        buffer = Buffer.from_file(path)
+
+        assert buffer._original == CONTENT
+
+    def test_lines_and_inserts(self, path):
+        buffer = Buffer(MappedText(path, chunk_size=7))
+        buffer.insert('added\n', 30)
+        expected = CONTENT[:30] + 'added\n' + CONTENT[30:]
+
+        assert str(buffer) == expected
+        assert buffer.line_count() == expected.count('\n') + 1
+        for line, line_text in enumerate(expected.split('\n')):
+            assert buffer.get_line(line) == line_text
@@ -0,0 +1,45 @@
+import pytest
+
+from ted import HeadlessScreen, Profiler, _env_flag, curses_main
+
+
+class TestProfiler:
+    def test_disabled_records_nothing(self):
+        profiler = Profiler()
+
+        with profiler.phase('edit'):
+            pass
+
+        assert profiler.summary().splitlines() == [profiler.summary()]
+
+    def test_enabled_records_phases(self):
+        profiler = Profiler(enabled=True)
+
+        with profiler.phase('edit'):
+            pass
+        profiler.record('render', 0.003)
+        profiler.record('render', 0.001)
+
+        rows = profiler.summary().splitlines()
+        assert [row.split()[:2] for row in rows[1:]] == [['edit', '1'], ['render', '2']]
+        assert rows[2].split()[2:] == ['2.000', '1.024', '4.096', '3.000']
+
+    def test_main_loop_phases(self, tmp_path):
+        path = tmp_path / 'content.txt'
+        path.write_text('this is test content\n')
+        profiler = Profiler(enabled=True)
+        screen = HeadlessScreen(['KEY_DOWN', 'a', 'q'])
+
+        curses_main(screen, str(path), doupdate=screen.doupdate, profiler=profiler)
+
+        # every key is already waiting, so they are all handled in one pass of the loop.
+        rows = profiler.summary().splitlines()
+        assert [row.split()[:2] for row in rows[1:]] == [['input', '1'], ['edit', '1'], ['render', '1'], ['refresh', '1']]
+
+
+@pytest.mark.parametrize('value, enabled', [
+    ('1', True), ('true', True), ('Yes', True), ('on', True), ('0', False), ('false', False), ('', False),
+])
+def test_profile_environment_flag(monkeypatch, value, enabled):
+    monkeypatch.setenv('TED_PROFILE', value)
+    assert _env_flag('TED_PROFILE') is enabled
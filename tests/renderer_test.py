@@ -0,0 +1,122 @@
+import pytest
+
+from ted import Buffer, File, FilePosition, Highlighter, PythonLexer, Renderer, Viewport
+
+
+class FakeScreen:
+    """Records the rows written to it instead of drawing them."""
+
+    def __init__(self):
+        self.rows = {}
+        self.written = []
+        self.styled = []
+        self._row = 0
+
+    def move(self, row, col):
+        self._row = row
+
+    def clrtoeol(self):
+        self.rows[self._row] = ''
+
+    def addstr(self, *args):
+        if isinstance(args[0], int):
+            self._row, _, text = args[:3]
+        else:
+            text = args[0]
+            self.styled.append((text, args[1] if len(args) > 1 else 0))
+        self.rows[self._row] = self.rows.get(self._row, '') + text
+        self.written.append(self._row)
+
+    def insstr(self, row, col, text, *args):
+        self.rows[row] = text
+        self.written.append(row)
+
+    def noutrefresh(self):
+        pass
+
+
+@pytest.fixture
+def screen():
+    return FakeScreen()
+
+
+def make_renderer(screen, height=5):
+    return Renderer(screen, Viewport(top=0, left=0, height=height, width=20), doupdate=lambda: None)
+
+
+class TestRenderer:
+    def test_first_frame_draws_everything(self, screen):
+        buffer = Buffer('one\ntwo\nthree')
+        file = File(buffer, FilePosition.origin())
+        renderer = make_renderer(screen)
+
+        renderer.draw(buffer, file)
+
+        assert sorted(set(screen.written)) == [0, 1, 2, 3, 6]
+        assert [screen.rows[row] for row in (1, 2, 3, 4, 5)] == ['one', 'two', 'three', '', '']
+
+    def test_unchanged_frame_draws_nothing(self, screen):
+        buffer = Buffer('one\ntwo\nthree')
+        file = File(buffer, FilePosition.origin())
+        renderer = make_renderer(screen)
+        renderer.draw(buffer, file)
+        screen.written.clear()
+
+        renderer.draw(buffer, file)
+
+        assert screen.written == []
+
+    def test_edit_within_line_redraws_only_that_line(self, screen):
+        buffer = Buffer('one\ntwo\nthree')
+        file = File(buffer, FilePosition(x=1, y=1))
+        renderer = make_renderer(screen)
+        renderer.draw(buffer, file)
+        screen.written.clear()
+
+        renderer.damage(file.write_char('w'))
+        renderer.draw(buffer, file)
+
+        assert screen.written == [2]
+        assert screen.rows[2] == 'twwo'
+
+    def test_new_line_redraws_lines_below(self, screen):
+        buffer = Buffer('one\ntwo\nthree')
+        file = File(buffer, FilePosition(x=1, y=1))
+        renderer = make_renderer(screen)
+        renderer.draw(buffer, file)
+        screen.written.clear()
+
+        renderer.damage(file.write_char('\n'))
+        renderer.draw(buffer, file)
+
+        assert screen.written == [2, 3, 4]
+        assert [screen.rows[row] for row in (1, 2, 3, 4, 5)] == ['one', 't', 'wo', 'three', '']
+
+    def test_scrolling_redraws_everything(self, screen):
+        buffer = Buffer('line\n' * 20)
+        file = File(buffer, FilePosition.origin())
+        renderer = make_renderer(screen)
+        renderer.draw(buffer, file)
+        screen.written.clear()
+
+        file.line_pos = 10
+        renderer.draw(buffer, file)
+
+        assert screen.written == [1, 2, 3, 4, 5]
+
+    def test_opening_string_redraws_lines_it_highlights(self, screen):
+        buffer = Buffer('x = 1\ny = 2\nz = 3')
+        file = File(buffer, FilePosition.origin())
+        renderer = make_renderer(screen)
+        renderer.highlighter = Highlighter(buffer, PythonLexer())
+        styles = {'string': 1}
+        renderer._styles = styles
+        renderer.draw(buffer, file)
+        screen.written.clear()
+        screen.styled.clear()
+
+        renderer.damage(file.write_text('"""'))
+        renderer.draw(buffer, file)
+
+        assert sorted(set(screen.written)) == [1, 2, 3]
+        assert ('y = 2', 1) in screen.styled
@@ -0,0 +1,34 @@
+from ted import KEY_ENTER, KEY_ESCAPE, Buffer, File, FilePosition, IncrementalSearch
+
+
+class TestIncrementalSearch:
+    def test_each_key_jumps_from_origin(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        file = File(buffer, FilePosition(x=3, y=0))
+        search = IncrementalSearch(file)
+
+        assert search.handle('t')
+        assert file._position == FilePosition(x=8, y=0)
+        assert search.handle('a')
+        assert file._position == FilePosition(x=5, y=1)
+        assert search.handle('KEY_BACKSPACE')
+        assert file._position == FilePosition(x=8, y=0)
+        assert search.status == 'search: t'
+
+    def test_enter_keeps_match(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        file = File(buffer, FilePosition.origin())
+        search = IncrementalSearch(file)
+        search.handle('u')
+
+        assert not search.handle(KEY_ENTER)
+        assert file._position == FilePosition(x=11, y=1)
+
+    def test_escape_returns_to_origin(self):
+        buffer = Buffer('this is test content\nthat takes up two lines')
+        file = File(buffer, FilePosition(x=3, y=0))
+        search = IncrementalSearch(file)
+        search.handle('u')
+
+        assert not search.handle(KEY_ESCAPE)
+        assert file._position == FilePosition(x=3, y=0)
@@ -0,0 +1,59 @@
+import io
+import json
+
+import pytest
+
+from ted import HeadlessScreen, RecordingScreen, _format_latencies, _read_keys, replay
+
+
+class TestRecordingScreen:
+    def test_logs_each_key(self):
+        trace = io.StringIO()
+        screen = RecordingScreen(HeadlessScreen(['a', 'b', 'KEY_LEFT']), trace)
+
+        assert _read_keys(screen) == ['a', 'b', 'KEY_LEFT']
+
+        entries = [json.loads(line) for line in trace.getvalue().splitlines()]
+        assert [(entry['key'], entry['pending']) for entry in entries] == [
+            ('a', False), ('b', True), ('KEY_LEFT', True),
+        ]
+        assert all(entry['time'] >= 0 for entry in entries)
+
+
+class TestReplay:
+    @pytest.fixture
+    def trace(self, tmp_path):
+        path = tmp_path / 'trace.jsonl'
+        entries = [
+            {'time': 0.1, 'key': 'KEY_DOWN', 'pending': False},
+            {'time': 0.2, 'key': 'a', 'pending': False},
+            {'time': 0.2, 'key': 'b', 'pending': True},
+            {'time': 0.3, 'key': 'q', 'pending': False},
+        ]
+        path.write_text(''.join(json.dumps(entry) + '\n' for entry in entries))
+        return path
+
+    def test_replay_reports_latency_per_read(self, trace, tmp_path):
+        path = tmp_path / 'content.txt'
+        path.write_text('this is test content\nthat takes up two lines')
+
+        latencies = replay(trace, path)
+
+        # the last key quits, so only the two before it are followed by another read.
+        assert len(latencies) == 2
+        assert path.read_text() == 'this is test content\nthat takes up two lines'
+
+    def test_replay_without_file(self, trace):
+        assert len(replay(trace)) == 2
+
+    def test_replay_trace_without_quit(self, tmp_path):
+        path = tmp_path / 'trace.jsonl'
+        path.write_text(json.dumps({'time': 0.1, 'key': 'a', 'pending': False}) + '\n')
+
+        assert len(replay(path)) == 1
+
+
+def test_format_latencies():
+    latencies = [index / 1000 for index in range(1, 101)]
+    assert _format_latencies(latencies) == 'keys: 100  p50: 50.000ms  p99: 99.000ms  max: 100.000ms'
+    assert _format_latencies([]) == 'no keys replayed'
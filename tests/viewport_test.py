@@ -0,0 +1,31 @@
+from ted import Viewport
+
+
+class TestFollow:
+    def test_no_scroll_when_visible(self):
+        viewport = Viewport(top=0, left=0, height=10, width=80)
+
+        viewport.follow(5, 5)
+
+        assert (viewport.top, viewport.left) == (0, 0)
+
+    def test_scroll_down_past_bottom(self):
+        viewport = Viewport(top=0, left=0, height=10, width=80)
+
+        viewport.follow(10, 0)
+
+        assert viewport.top == 1
+
+    def test_scroll_up_past_top(self):
+        viewport = Viewport(top=20, left=0, height=10, width=80)
+
+        viewport.follow(15, 0)
+
+        assert viewport.top == 15
+
+    def test_scroll_right_past_edge(self):
+        viewport = Viewport(top=0, left=0, height=10, width=80)
+
+        viewport.follow(0, 85)
+
+        assert viewport.left == 6